@@ -0,0 +1,119 @@
+# async_db.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from config import FIRESTORE_MAX_WORKERS
+
+# firebase_admin 的 Firestore API 是同步的，統一丟到執行緒池執行，避免卡住 Discord event loop
+_executor = ThreadPoolExecutor(
+    max_workers=FIRESTORE_MAX_WORKERS, thread_name_prefix="firestore"
+)
+
+# label -> {"count", "errors", "total", "max"}（秒）
+_stats = {}
+
+
+def _record(label, elapsed, failed):
+    stat = _stats.setdefault(
+        label, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0}
+    )
+    stat["count"] += 1
+    stat["total"] += elapsed
+    stat["max"] = max(stat["max"], elapsed)
+    if failed:
+        stat["errors"] += 1
+
+
+async def run(label, fn, *args, **kwargs):
+    """在執行緒池執行同步的 Firestore 呼叫，並依 label 記錄延遲"""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    failed = False
+    try:
+        return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _record(label, time.perf_counter() - start, failed)
+
+
+async def stream(label, query):
+    return await run(label, lambda: list(query.stream()))
+
+
+async def get_doc(label, ref):
+    return await run(label, ref.get)
+
+
+async def add(label, collection_ref, data):
+    return await run(label, collection_ref.add, data)
+
+
+async def set_doc(label, ref, data, merge=False):
+    return await run(label, ref.set, data, merge=merge)
+
+
+async def update(label, ref, data):
+    return await run(label, ref.update, data)
+
+
+async def delete(label, ref):
+    return await run(label, ref.delete)
+
+
+# Firestore 單一 batch 最多 500 個寫入
+BATCH_LIMIT = 500
+
+
+def _commit_writes(db, ops):
+    for i in range(0, len(ops), BATCH_LIMIT):
+        batch = db.batch()
+        for op, ref, data in ops[i : i + BATCH_LIMIT]:
+            if op == "set":
+                batch.set(ref, data)
+            elif op == "update":
+                batch.update(ref, data)
+            elif op == "delete":
+                batch.delete(ref)
+            else:
+                raise ValueError(f"Unknown batch op: {op}")
+        batch.commit()
+    return len(ops)
+
+
+async def commit_writes(label, db, ops):
+    """以 batched write 執行 [("set" | "update" | "delete", ref, data), ...]，每 500 筆 commit 一次，回傳筆數"""
+    return await run(label, _commit_writes, db, ops)
+
+
+async def commit_sets(label, db, writes):
+    """以 batched write 寫入 [(ref, data), ...]"""
+    return await commit_writes(label, db, [("set", ref, data) for ref, data in writes])
+
+
+async def commit_deletes(label, db, refs):
+    """以 batched write 刪除多筆文件"""
+    return await commit_writes(label, db, [("delete", ref, None) for ref in refs])
+
+
+def get_stats():
+    """目前各 label 統計的複本"""
+    return {label: dict(stat) for label, stat in _stats.items()}
+
+
+def format_stats():
+    stats = get_stats()
+    if not stats:
+        return "（尚無 Firestore 呼叫紀錄）"
+    lines = []
+    for label, stat in sorted(stats.items()):
+        avg_ms = stat["total"] / stat["count"] * 1000
+        lines.append(
+            f"{label}: {stat['count']} 次, avg {avg_ms:.0f}ms, "
+            f"max {stat['max'] * 1000:.0f}ms, errors {stat['errors']}"
+        )
+    return "\n".join(lines)
+
@@ -0,0 +1,95 @@
+# batch_progress.py
+import asyncio
+import io
+import time
+from collections import Counter
+
+import discord
+
+# Discord 單則訊息上限 2000 字，保留一些空間
+MESSAGE_LIMIT = 1900
+BAR_WIDTH = 20
+
+
+class BatchProgress:
+    """批次開始就發一則進度訊息，結果回來時原地編輯（最多每 interval 秒一次），結束時附上完整結果檔"""
+
+    def __init__(self, channel, batch_id, codes, total, interval=2.0):
+        self.channel = channel
+        self.batch_id = batch_id
+        self.total = total
+        self.interval = interval
+        self.counts = {code: Counter() for code in codes}
+        self.reasons = Counter()
+        self.done = 0
+        self.started = time.monotonic()
+        self.message = None
+        self.last_edit = 0.0
+        self.editor = None
+
+    async def start(self):
+        try:
+            self.message = await self.channel.send(self.render())
+            self.last_edit = time.monotonic()
+        except Exception as e:
+            print(f"❌ Failed to send progress message: {type(e).__name__}: {e}")
+
+    def add(self, outcomes):
+        for outcome in outcomes:
+            self.counts.setdefault(outcome["code"], Counter())[outcome["result"]] += 1
+            if outcome["result"] == "fail":
+                self.reasons[outcome["reason"]] += 1
+            self.done += 1
+        # 已經有排定的編輯就等它一起送出（編輯時會重新整理目前的統計）
+        if self.message is not None and self.editor is None:
+            self.editor = asyncio.create_task(self._edit_later())
+
+    async def _edit_later(self):
+        try:
+            delay = self.last_edit + self.interval - time.monotonic()
+            await asyncio.sleep(max(0.0, delay))
+            self.last_edit = time.monotonic()
+            await self.message.edit(content=self.render())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Failed to edit progress message: {type(e).__name__}: {e}")
+        finally:
+            self.editor = None
+
+    def render(self, finished=False):
+        elapsed = time.monotonic() - self.started
+        filled = BAR_WIDTH * self.done // self.total if self.total else BAR_WIDTH
+        status = "✅ Done" if finished else "⏳ Redeeming"
+        lines = [
+            f"📦 {status} batch `{self.batch_id}` "
+            f"[{'█' * filled}{'░' * (BAR_WIDTH - filled)}] "
+            f"{self.done}/{self.total} ({elapsed:.0f}s)"
+        ]
+        for code, counts in self.counts.items():
+            line = f"`{code}`: ✅ {counts['success']}  ❌ {counts['fail']}"
+            if counts["skipped"]:
+                line += f"  ⏭️ {counts['skipped']}"
+            lines.append(line)
+        if self.reasons:
+            top = self.reasons.most_common(5)
+            lines.append("Failures: " + ", ".join(f"{r} × {n}" for r, n in top))
+        return "\n".join(lines)[:MESSAGE_LIMIT]
+
+    async def finish(self, full_text):
+        """最後一次編輯，完整結果以附件送出（不受訊息長度限制）"""
+        if self.editor is not None:
+            self.editor.cancel()
+            self.editor = None
+        content = self.render(finished=True)
+        result_file = discord.File(
+            io.BytesIO(full_text.encode("utf-8")),
+            filename=f"redeem_{self.batch_id}.txt",
+        )
+        try:
+            if self.message is not None:
+                await self.message.edit(content=content, attachments=[result_file])
+            else:
+                await self.channel.send(content, file=result_file)
+        except Exception as e:
+            print(f"❌ Failed to send result message: {type(e).__name__}: {e}")
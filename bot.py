@@ -1,11 +1,15 @@
+import time
+
+# 啟動計時：記錄 import、Firebase 初始化、載入 cog、連線 gateway、同步指令各花多久
+_startup = {"start": time.perf_counter()}
+
 import os
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from dotenv import load_dotenv
 import asyncio
 from datetime import datetime, timedelta
 import pytz
-from tasks.notify_loop import run_notify_once
 import firebase_admin
 import json
 from firebase_admin import credentials, firestore
@@ -13,8 +17,16 @@ from google.cloud.firestore_v1 import FieldFilter
 
 
 load_dotenv()
+
+# config 在 import 時讀取環境變數，必須在 load_dotenv() 之後匯入
+from config import GUILD_IDS, FORCE_COMMAND_SYNC
+from tasks.notify_scheduler import NotifyScheduler
+from tasks.audit_log import AuditLog
+import command_sync
+
+_startup["imports"] = time.perf_counter()
+
 TOKEN = os.getenv("DISCORD_TOKEN")
-GUILD_IDS = [1299413864160428054, 1125331349654470786]
 TIMEZONE = pytz.timezone("Asia/Taipei")
 
 # 初始化 Firebase
@@ -26,22 +38,37 @@ cred = credentials.Certificate(cred_json)
 firebase_admin.initialize_app(cred)
 
 db = firestore.client()
+_startup["firebase"] = time.perf_counter()
 
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+
+class GuaGuaBot(commands.Bot):
+    async def close(self):
+        # 關閉 Discord 連線前先送出尚未寫出的操作紀錄
+        audit_log = getattr(self, "audit_log", None)
+        if audit_log is not None:
+            await audit_log.stop()
+        await super().close()
+
+
+bot = GuaGuaBot(command_prefix="!", intents=intents)
 
 
 @bot.event
 async def on_ready():
     print(f"✅ GuaGuaBOT is online as {bot.user}")
 
-    # ⚠️ 清除全域指令
-    await bot.tree.sync()  # 先拉下現有的
-    bot.tree.clear_commands()  # 全部清除
-    await bot.tree.sync()  # 同步上去
-    print("🧹 Cleared global slash commands.")
+    # on_ready 在 gateway 重新連線時也會觸發，指令同步每個程序只做一次
+    if "ready" in _startup:
+        return
+    _startup["ready"] = time.perf_counter()
 
-    # 🚫 清除舊的 debug guild 指令（如曾經註冊過）
+    # ⚠️ 清除全域指令：add_cog 會把每個指令也放進全域 tree，只保留各伺服器的指令
+    # （全域指紋因此固定為空，只有第一次會把 Discord 上的全域指令同步成空的）
+    bot.tree.clear_commands(guild=None)
+
+    # 🚫 移除 debug 指令，不同步到伺服器
     for gid in GUILD_IDS:
         guild = discord.Object(id=gid)
         for cmd in bot.tree.get_commands(guild=guild):
@@ -51,53 +78,38 @@ async def on_ready():
                 or cmd.name == "whoami"
             ):
                 bot.tree.remove_command(cmd.name, guild=guild)
-        print(f"🧹 Removed old debug commands in guild {gid}")
 
-    # ✅ 接著重新註冊 Guild 指令
-    for gid in GUILD_IDS:
-        guild = discord.Object(id=gid)
-        await bot.tree.sync(guild=guild)
-        print(f"✅ Synced commands for guild {gid}")
-
-    # notify_task.start()
-
-
-# ✅ 自動通知排程
-@tasks.loop(seconds=30)
-async def notify_task():
-    await run_notify_once(bot)
-
-    # try:
-    #     docs = (
-    #         db.collection("notifications")
-    #         .where(filter=FieldFilter("datetime", ">=", lower_bound))
-    #         .where(filter=FieldFilter("datetime", "<=", upper_bound))
-    #         .stream()
-    #     )
-
-    #     for doc in docs:
-    #         data = doc.to_dict()
-    #         channel_id = data.get("channel_id")
-    #         mention = data.get("mention", "")
-    #         message = data.get("message", "")
-
-    #         try:
-    #             channel = await bot.fetch_channel(channel_id)
-    #             if channel:
-    #                 content = (
-    #                     f"{mention}\n⏰ 活動提醒 ⏰{message}"
-    #                     if mention
-    #                     else f"⏰ 活動提醒 ⏰{message}"
-    #                 )
-    #                 await channel.send(content)
-    #                 db.collection("notifications").document(doc.id).delete()
-    #             else:
-    #                 print(f"⚠️ 無法取得頻道：{channel_id}")
-    #         except Exception as e:
-    #             print(f"❌ 發送提醒失敗（頻道 {channel_id}）：{type(e).__name__}: {e}")
-
-    # except Exception as e:
-    #     print(f"❌ notify_task 整體失敗：{type(e).__name__}: {e}")
+    # ✅ 只同步指令有變動的伺服器（指紋存在 Firestore bot_meta/command_sync）
+    try:
+        synced = await command_sync.sync_changed(
+            bot, db, GUILD_IDS, force=FORCE_COMMAND_SYNC
+        )
+        if synced:
+            print(f"✅ Synced commands for: {', '.join(synced)}")
+        else:
+            print("✅ Slash commands unchanged, skipped sync.")
+    except Exception as e:
+        print(f"❌ Command sync failed: {type(e).__name__}: {e}")
+    _startup["sync"] = time.perf_counter()
+    print_startup_timing()
+
+
+def print_startup_timing():
+    stages = [
+        ("imports", "imports"),
+        ("firebase", "firebase init"),
+        ("cogs", "cog load"),
+        ("scheduler", "notify scheduler"),
+        ("ready", "gateway connect"),
+        ("sync", "command sync"),
+    ]
+    parts = []
+    prev = _startup["start"]
+    for key, label in stages:
+        parts.append(f"{label} {_startup[key] - prev:.2f}s")
+        prev = _startup[key]
+    total = _startup["sync"] - _startup["start"]
+    print(f"⏱️ Startup {total:.2f}s: " + ", ".join(parts))
 
 
 # ✅ 載入所有指令模組
@@ -111,10 +123,19 @@ async def load_cogs():
 
 async def main():
     async with bot:
+        # ✅ 操作紀錄（合併後批次送到 Discord 與 Firestore）
+        bot.audit_log = AuditLog(bot)
+        await bot.audit_log.start()
         await load_cogs()
-        notify_task.start()
-        print("✅ notify_task loop started")
-        await bot.start(TOKEN)
+        _startup["cogs"] = time.perf_counter()
+        # ✅ 自動通知排程（依提醒時間精準喚醒，取代每 30 秒輪詢）
+        bot.notify_scheduler = NotifyScheduler(bot)
+        await bot.notify_scheduler.start()
+        _startup["scheduler"] = time.perf_counter()
+        try:
+            await bot.start(TOKEN)
+        finally:
+            await bot.notify_scheduler.stop()
 
 
 if __name__ == "__main__":
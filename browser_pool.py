@@ -0,0 +1,98 @@
+# browser_pool.py
+import asyncio
+from contextlib import asynccontextmanager
+
+from redeem import create_driver
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.broken = False
+
+    def is_alive(self):
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"⚠️ Failed to quit browser session: {type(e).__name__}: {e}")
+
+
+class BrowserPool:
+    """保持固定數量的 WebDriver session，跨任務重複使用，用滿 max_uses 或壞掉時重建"""
+
+    def __init__(self, size=2, max_uses=50):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            # None 代表空位，取用時才啟動 Chrome
+            self._slots.put_nowait(None)
+        self._closed = False
+
+    async def warm_up(self):
+        """預先啟動所有 session，避免第一批任務還要等 Chrome 開機"""
+        for _ in range(self.size):
+            slot = await self._slots.get()
+            if slot is None:
+                try:
+                    slot = await asyncio.to_thread(self._new_session)
+                except Exception as e:
+                    print(f"❌ Browser warm-up failed: {type(e).__name__}: {e}")
+            self._slots.put_nowait(slot)
+
+    def _new_session(self):
+        session = BrowserSession(create_driver())
+        print("🌐 Started new browser session")
+        return session
+
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError("Browser pool is closed.")
+        slot = await self._slots.get()
+        if slot is not None:
+            return slot
+        try:
+            return await asyncio.to_thread(self._new_session)
+        except Exception:
+            self._slots.put_nowait(None)
+            raise
+
+    async def release(self, session):
+        session.uses += 1
+        if self._closed or session.broken or session.uses >= self.max_uses:
+            reason = "broken" if session.broken else f"{session.uses} uses"
+            print(f"♻️ Recycling browser session ({reason})")
+            await asyncio.to_thread(session.quit)
+            self._slots.put_nowait(None)
+        else:
+            self._slots.put_nowait(session)
+
+    @asynccontextmanager
+    async def session(self):
+        session = await self.acquire()
+        try:
+            yield session
+        except BaseException:
+            session.broken = True
+            raise
+        finally:
+            await self.release(session)
+
+    async def close(self):
+        self._closed = True
+        sessions = []
+        while not self._slots.empty():
+            slot = self._slots.get_nowait()
+            if slot is not None:
+                sessions.append(slot)
+        for session in sessions:
+            await asyncio.to_thread(session.quit)
+        print(f"🛑 Browser pool closed ({len(sessions)} session(s) shut down)")
@@ -4,11 +4,11 @@ import discord
 from discord import app_commands
 from discord.ext.commands import Cog
 from config import GUILD_IDS
-from tasks.notify_loop import run_notify_once
 from firebase_admin import firestore
 from datetime import datetime
 from config import ENABLE_DEBUG_COMMANDS
 import pytz
+import async_db
 
 OWNER_ID = 271962747225374721
 TIMEZONE = pytz.timezone("Asia/Taipei")
@@ -29,7 +29,8 @@ class DebugNotify(Cog):
             )
             return
         await interaction.response.send_message("🛠️ 立即執行通知排程...", ephemeral=True)
-        await run_notify_once(self.bot)
+        # 只喚醒排程器檢查到期提醒，不另外掃描發送，避免與排程器重複發送
+        self.bot.notify_scheduler.wakeup.set()
 
     @app_commands.command(name="show_now_time", description="顯示 BOT 現在時間")
     async def show_now_time(self, interaction: discord.Interaction):
@@ -53,16 +54,29 @@ class DebugNotify(Cog):
     @app_commands.command(name="debug_firestore_count", description="顯示提醒總筆數")
     async def debug_firestore_count(self, interaction: discord.Interaction):
         guild_id = str(interaction.guild_id)
-        docs = (
-            self.db.collection("notifications")
-            .where("guild_id", "==", guild_id)
-            .stream()
+        docs = await async_db.stream(
+            "notifications.count",
+            self.db.collection("notifications").where("guild_id", "==", guild_id),
         )
-        count = sum(1 for _ in docs)
+        count = len(docs)
         await interaction.response.send_message(
             f"📊 資料庫中提醒總筆數：`{count}`", ephemeral=True
         )
 
+    @app_commands.command(
+        name="debug_db_stats", description="顯示 Firestore 呼叫延遲統計"
+    )
+    async def debug_db_stats(self, interaction: discord.Interaction):
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message(
+                "🚫 你無權使用這個指令。", ephemeral=True
+            )
+            return
+        await interaction.response.send_message(
+            f"📈 Firestore 呼叫統計：\n```\n{async_db.format_stats()[:1900]}\n```",
+            ephemeral=True,
+        )
+
     async def cog_load(self):
         if not ENABLE_DEBUG_COMMANDS:
             print("🚫 Debug commands disabled by .env config.")
@@ -73,6 +87,7 @@ class DebugNotify(Cog):
             self.bot.tree.add_command(self.show_now_time, guild=guild)
             self.bot.tree.add_command(self.whoami, guild=guild)
             self.bot.tree.add_command(self.debug_firestore_count, guild=guild)
+            self.bot.tree.add_command(self.debug_db_stats, guild=guild)
             print(f"✅ Registered debug commands to guild: {gid}")
 
 
@@ -23,26 +23,32 @@ class HelpCommand(Cog):
         if language.value == "en":
             content = (
                 "**GuaGuaBOT Command List (English):**\n\n"
-                "• `/redeem_submit` - Submit gift code\n"
+                "• `/redeem_submit` - Submit gift code(s), comma-separated for multiple\n"
+                "• `/redeem_stats` - Show redeem worker latency and result stats\n"
                 "• `/add_id` - Add a player ID\n"
                 "• `/remove_id` - Remove a player ID\n"
                 "• `/list_ids` - List all saved player IDs\n"
+                "• `/import_ids` - Bulk import player IDs (file or text)\n"
+                "• `/export_ids` - Export player IDs as ids.txt\n"
                 "• `/add_notify` - Add event reminder\n"
-                "• `/edit_notify` - Edit reminder by index\n"
-                "• `/remove_notify` - Remove event reminder\n"
+                "• `/edit_notify` - Edit reminder by ID (autocomplete)\n"
+                "• `/remove_notify` - Remove event reminder by ID (autocomplete)\n"
                 "• `/list_notify` - List all reminders\n"
                 "• `/help` - Show this help message"
             )
         else:
             content = (
                 "**GuaGuaBOT 指令列表(繁體中文):**\n\n"
-                "• `/redeem_submit` - 呱呱要開機才能兌換\n"
+                "• `/redeem_submit` - 呱呱要開機才能兌換（多組兌換碼用逗號分隔）\n"
+                "• `/redeem_stats` - 兌換 Worker 統計 - 看看哪一步最慢\n"
                 "• `/add_id` - 新增玩家ID - 下次組隊兌換\n"
                 "• `/remove_id` - 移除玩家ID - 不要給我亂移除\n"
                 "• `/list_ids` - 列出所有玩家ID - 看看誰是幸運兒\n"
+                "• `/import_ids` - 批次匯入玩家ID - 檔案或文字都可以\n"
+                "• `/export_ids` - 匯出玩家ID - 存成 ids.txt\n"
                 "• `/add_notify` - 新增活動提醒 - 可以指定標記\n"
-                "• `/edit_notify` - 編輯提醒內容(依 index 編號)\n"
-                "• `/remove_notify` - 移除活動提醒 - 打錯也不擔心\n"
+                "• `/edit_notify` - 編輯提醒內容(依提醒 ID，可打關鍵字搜尋)\n"
+                "• `/remove_notify` - 移除活動提醒(依提醒 ID) - 打錯也不擔心\n"
                 "• `/list_notify` - 查看目前提醒列表 - 但你看不到誰要吵你\n"
                 "• `/help` - 顯示此說明 - 啥都不懂看這邊"
             )
@@ -1,8 +1,18 @@
+import io
+import time
+from typing import Optional
+
 import discord
 from discord import app_commands
 from discord.ext.commands import Cog
 from firebase_admin import firestore
 from config import GUILD_IDS  # 引用 GUILD_IDS
+import async_db
+from pagination import FirestorePaginator
+from roster import roster, parse_id_lines
+
+# 匯入檔案大小上限（約 10 萬個 ID）
+MAX_IMPORT_BYTES = 1024 * 1024
 
 
 class IDManager(Cog):
@@ -21,24 +31,23 @@ class IDManager(Cog):
                 ephemeral=True,
             )
             return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
         guild_id = str(interaction.guild_id)  # Fetch the guild ID
-        existing = (
-            self.db.collection("ids")
-            .document(guild_id)
-            .collection("players")
-            .where("player_id", "==", player_id)
-            .stream()
-        )
-        if any(existing):
-            await interaction.response.send_message(
+        if await roster.contains(guild_id, player_id):
+            await interaction.followup.send(
                 f"⚠️ Player ID `{player_id}` already exists.", ephemeral=True
             )
             return
 
-        self.db.collection("ids").document(guild_id).collection("players").add(
-            {"player_id": player_id}
+        # 以 player_id 作為文件 ID，重複新增只會覆寫同一筆
+        await async_db.set_doc(
+            "ids.add",
+            roster.players_ref(guild_id).document(player_id),
+            {"player_id": player_id},
         )
-        await interaction.response.send_message(
+        roster.added(guild_id, player_id)
+        await interaction.followup.send(
             f"✅ Player ID `{player_id}` added successfully.", ephemeral=True
         )
 
@@ -47,27 +56,21 @@ class IDManager(Cog):
     )
     @app_commands.describe(player_id="Player ID to remove")
     async def remove_id(self, interaction: discord.Interaction, player_id: str):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         guild_id = str(interaction.guild_id)
-        found = False
-        docs = (
-            self.db.collection("ids")
-            .document(guild_id)
-            .collection("players")
-            .where("player_id", "==", player_id)
-            .stream()
-        )
-        for doc in docs:
-            self.db.collection("ids").document(guild_id).collection("players").document(
-                doc.id
-            ).delete()
-            found = True
+        doc_ids = await roster.doc_ids(guild_id, player_id)
+        for doc_id in doc_ids:
+            await async_db.delete(
+                "ids.delete", roster.players_ref(guild_id).document(doc_id)
+            )
+        roster.removed(guild_id, player_id)
 
-        if found:
-            await interaction.response.send_message(
+        if doc_ids:
+            await interaction.followup.send(
                 f"🗑️ Player ID `{player_id}` removed successfully.", ephemeral=True
             )
         else:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"⚠️ Player ID `{player_id}` not found.", ephemeral=True
             )
 
@@ -75,21 +78,99 @@ class IDManager(Cog):
         name="list_ids", description="List all player IDs stored / 列出所有玩家ID"
     )
     async def list_ids(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         guild_id = str(interaction.guild_id)
-        docs = (
-            self.db.collection("ids").document(guild_id).collection("players").stream()
+        paginator = FirestorePaginator(
+            query=self.db.collection("ids")
+            .document(guild_id)
+            .collection("players")
+            .order_by("player_id"),
+            render=lambda doc, i: f"- `{doc.to_dict()['player_id']}`",
+            title="📋 Player ID List",
+            label="ids.page",
+            author_id=interaction.user.id,
+            empty_text="📭 No player IDs found.",
         )
+        await paginator.send(interaction)
 
-        if not docs:
-            await interaction.response.send_message(
-                "📭 No player IDs found.", ephemeral=True
+    @app_commands.command(
+        name="import_ids",
+        description="Bulk import player IDs / 批次匯入玩家ID（檔案或文字）",
+    )
+    @app_commands.describe(
+        file="ids.txt 格式的檔案（一行一個 ID，# 開頭為註解）",
+        ids="玩家 ID（以逗號或空白分隔）",
+    )
+    async def import_ids(
+        self,
+        interaction: discord.Interaction,
+        file: Optional[discord.Attachment] = None,
+        ids: Optional[str] = None,
+    ):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        start = time.perf_counter()
+
+        text = ids or ""
+        if file is not None:
+            if file.size > MAX_IMPORT_BYTES:
+                await interaction.followup.send(
+                    "❌ File too large / 檔案過大", ephemeral=True
+                )
+                return
+            raw = await file.read()
+            text += "\n" + raw.decode("utf-8", errors="ignore")
+
+        player_ids, invalid = parse_id_lines(text)
+        if not player_ids and not invalid:
+            await interaction.followup.send(
+                "❌ Please attach a file or enter IDs / 請附加檔案或輸入 ID",
+                ephemeral=True,
             )
             return
 
-        ids = [doc.to_dict()["player_id"] for doc in docs]
-        ids_text = "\n".join(f"- `{pid}`" for pid in ids)
-        await interaction.response.send_message(
-            f"📋 Player ID List:\n{ids_text}", ephemeral=True
+        guild_id = str(interaction.guild_id)
+        existing = set(await roster.player_ids(guild_id))
+        new_ids = [pid for pid in player_ids if pid not in existing]
+
+        players_ref = roster.players_ref(guild_id)
+        await async_db.commit_sets(
+            "ids.import",
+            self.db,
+            [(players_ref.document(pid), {"player_id": pid}) for pid in new_ids],
+        )
+        for pid in new_ids:
+            roster.added(guild_id, pid)
+
+        elapsed = time.perf_counter() - start
+        lines = [
+            f"📥 Imported `{len(new_ids)}` player ID(s) in {elapsed:.2f}s",
+            f"⚠️ Already exists: `{len(player_ids) - len(new_ids)}`",
+            f"❌ Invalid: `{len(invalid)}`",
+        ]
+        if invalid:
+            preview = ", ".join(f"`{token[:20]}`" for token in invalid[:10])
+            lines.append(f"   {preview}{' ...' if len(invalid) > 10 else ''}")
+        await interaction.followup.send("\n".join(lines), ephemeral=True)
+
+    @app_commands.command(
+        name="export_ids", description="Export player IDs as ids.txt / 匯出玩家ID"
+    )
+    async def export_ids(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        start = time.perf_counter()
+
+        player_ids = await roster.player_ids(interaction.guild_id)
+        if not player_ids:
+            await interaction.followup.send("📭 No player IDs found.", ephemeral=True)
+            return
+
+        content = f"# GuaGuaBOT player IDs (guild {interaction.guild_id})\n"
+        content += "\n".join(player_ids) + "\n"
+        elapsed = time.perf_counter() - start
+        await interaction.followup.send(
+            f"📤 Exported `{len(player_ids)}` player ID(s) in {elapsed:.2f}s",
+            file=discord.File(io.BytesIO(content.encode("utf-8")), filename="ids.txt"),
+            ephemeral=True,
         )
 
     async def cog_load(self):
@@ -98,6 +179,8 @@ class IDManager(Cog):
             self.bot.tree.add_command(self.add_id, guild=guild)
             self.bot.tree.add_command(self.remove_id, guild=guild)
             self.bot.tree.add_command(self.list_ids, guild=guild)
+            self.bot.tree.add_command(self.import_ids, guild=guild)
+            self.bot.tree.add_command(self.export_ids, guild=guild)
 
 
 async def setup(bot):
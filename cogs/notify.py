@@ -3,11 +3,15 @@ import discord
 from discord import app_commands
 from discord.ext.commands import Cog
 from firebase_admin import firestore
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 import pytz
 
-from config import GUILD_IDS, ROLE_PERMISSIONS, LOG_CHANNEL_ID, LOG_FIRESTORE_ENABLED
+from config import GUILD_IDS, ROLE_PERMISSIONS
+import async_db
+from pagination import FirestorePaginator
+from tasks.recurrence import build_recurrence, describe
+from tasks.reminder_cache import reminder_cache, short_id
 
 TIMEZONE = pytz.timezone("Asia/Taipei")
 
@@ -17,32 +21,11 @@ def has_permission(interaction: discord.Interaction, command_name: str) -> bool:
     return any(role.id in allowed_roles for role in interaction.user.roles)
 
 
-async def send_notify_log(
+def send_notify_log(
     bot: discord.Client, message: str, guild_id: Optional[str] = None
 ):
-    timestamp = datetime.now().astimezone(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
-
-    try:
-        channel = await bot.fetch_channel(LOG_CHANNEL_ID)
-        if channel:
-            await channel.send(f"📝 [`{timestamp}`] {message}")
-    except Exception as e:
-        print(f"❌ Discord log failed: {type(e).__name__}: {e}")
-
-    if LOG_FIRESTORE_ENABLED:
-        try:
-            db = firestore.client()
-            log_data = {
-                "message": message,
-                "timestamp": firestore.SERVER_TIMESTAMP,
-                "datetime": timestamp,
-                "source": "notify.py",
-            }
-            if guild_id:
-                log_data["guild_id"] = str(guild_id)
-            db.collection("logs").add(log_data)
-        except Exception as e:
-            print(f"❌ Firestore log failed: {type(e).__name__}: {e}")
+    # 排入 bot.audit_log 佇列後立即返回，由背景合併送到 Discord 與 Firestore
+    bot.audit_log.log(message, guild_id=guild_id)
 
 
 class Notify(Cog):
@@ -59,6 +42,17 @@ class Notify(Cog):
         message="提醒內容",
         mention="要標記的人 (可選)",
         channel="發送頻道 (可選)",
+        repeat="重複提醒 (可選)",
+        interval="每隔幾個單位重複一次 (預設 1)",
+        until="重複到哪一天為止 (YYYY-MM-DD, 可選)",
+        count="總共提醒幾次 (可選)",
+    )
+    @app_commands.choices(
+        repeat=[
+            app_commands.Choice(name="每 N 小時", value="hourly"),
+            app_commands.Choice(name="每 N 天", value="daily"),
+            app_commands.Choice(name="每 N 週", value="weekly"),
+        ]
     )
     async def add_notify(
         self,
@@ -68,6 +62,10 @@ class Notify(Cog):
         message: str,
         mention: Optional[str] = None,
         channel: Optional[discord.TextChannel] = None,
+        repeat: Optional[app_commands.Choice[str]] = None,
+        interval: Optional[app_commands.Range[int, 1, 999]] = 1,
+        until: Optional[str] = None,
+        count: Optional[app_commands.Range[int, 1, 999]] = None,
     ):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
@@ -93,6 +91,22 @@ class Notify(Cog):
             )
             return
 
+        recurrence = None
+        if repeat:
+            until_dt = None
+            if until:
+                try:
+                    # 包含結束當天
+                    until_dt = TIMEZONE.localize(
+                        datetime.strptime(until, "%Y-%m-%d")
+                    ) + timedelta(days=1)
+                except ValueError:
+                    await interaction.followup.send(
+                        f"❌ 結束日期格式錯誤：{until}", ephemeral=True
+                    )
+                    return
+            recurrence = build_recurrence(repeat.value, interval, until_dt, count)
+
         total = dates if len(times) == 1 else times
         for i in total:
             try:
@@ -104,19 +118,22 @@ class Notify(Cog):
                 )
                 return
 
-            self.db.collection("notifications").add(
-                {
-                    "guild_id": str(interaction.guild_id),
-                    "channel_id": channel.id,
-                    "datetime": dt,
-                    "mention": mention or "",
-                    "message": message,
-                }
+            data = {
+                "guild_id": str(interaction.guild_id),
+                "channel_id": channel.id,
+                "datetime": dt,
+                "mention": mention or "",
+                "message": message,
+                "recurrence": recurrence,
+            }
+            _, doc_ref = await async_db.add(
+                "notifications.add", self.db.collection("notifications"), data
             )
+            reminder_cache.put(doc_ref.id, data)
 
-            await send_notify_log(
+            send_notify_log(
                 self.bot,
-                f"{interaction.user} 新增提醒 `{dt_str}` 到 <#{channel.id}> in guild {interaction.guild_id}",
+                f"{interaction.user} 新增提醒 `{dt_str}`{' ' + describe(recurrence) if recurrence else ''} 到 <#{channel.id}> in guild {interaction.guild_id}",
                 guild_id=interaction.guild_id,
             )
 
@@ -126,57 +143,75 @@ class Notify(Cog):
     async def list_notify(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        docs = (
-            self.db.collection("notifications")
+        def render(doc, index):
+            data = doc.to_dict()
+            line = reminder_cache.label(doc.id, data)
+            if data.get("recurrence"):
+                line += f" | {describe(data['recurrence'])}"
+            return line[:200]
+
+        paginator = FirestorePaginator(
+            query=self.db.collection("notifications")
             .where("guild_id", "==", str(interaction.guild_id))
-            .order_by("datetime")
-            .stream()
+            .order_by("datetime"),
+            render=render,
+            title="📅 提醒列表",
+            label="notifications.page",
+            author_id=interaction.user.id,
+            empty_text="⚠️ 尚未設定任何提醒",
         )
-        docs = list(docs)
-        if not docs:
-            await interaction.followup.send("⚠️ 尚未設定任何提醒")
-            return
-
-        self.bot.cached_notify_docs = [(i, d.id) for i, d in enumerate(docs)]
-        messages = [
-            f"[{i}] {d.to_dict()['datetime'].astimezone(TIMEZONE).strftime('%Y-%m-%d %H:%M')} | {d.to_dict()['message']}"
-            for i, d in enumerate(docs)
-        ]
-        await interaction.followup.send("📅 提醒列表：\n" + "\n".join(messages))
-
-    @app_commands.command(name="remove_notify", description="移除提醒 (index)")
-    @app_commands.describe(index="提醒編號")
-    async def remove_notify(self, interaction: discord.Interaction, index: int):
+        await paginator.send(interaction)
+
+    async def resolve_reminder(self, guild_id, reminder_id):
+        """以短 ID 找出提醒，回傳 (doc_id, data)；只有快取尚未載入時才查 Firestore"""
+        found = reminder_cache.resolve(guild_id, reminder_id)
+        # 快取已由 snapshot 載入時找不到就是不存在（例如 ID 打錯），不必再掃整個 guild
+        if found or reminder_cache.loaded:
+            return found
+
+        docs = await async_db.stream(
+            "notifications.resolve",
+            self.db.collection("notifications").where(
+                "guild_id", "==", str(guild_id)
+            ),
+        )
+        matches = [d for d in docs if d.id.startswith(reminder_id.strip())]
+        if len(matches) != 1:
+            return None
+        return matches[0].id, matches[0].to_dict()
+
+    @app_commands.command(name="remove_notify", description="移除提醒 (提醒 ID)")
+    @app_commands.describe(reminder_id="提醒 ID（可輸入關鍵字搜尋）")
+    async def remove_notify(self, interaction: discord.Interaction, reminder_id: str):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         if not has_permission(interaction, "remove_notify"):
             await interaction.followup.send("🚫 你沒有權限移除提醒", ephemeral=True)
             return
 
-        docs = (
-            self.db.collection("notifications")
-            .where("guild_id", "==", str(interaction.guild_id))
-            .order_by("datetime")
-            .stream()
-        )
-        doc_list = list(docs)
-        if index < 0 or index >= len(doc_list):
-            await interaction.followup.send("❌ 無效 index", ephemeral=True)
+        found = await self.resolve_reminder(interaction.guild_id, reminder_id)
+        if not found:
+            await interaction.followup.send("❌ 找不到該提醒 ID", ephemeral=True)
             return
 
-        doc_id = doc_list[index].id
-        self.db.collection("notifications").document(doc_id).delete()
+        doc_id, _ = found
+        await async_db.delete(
+            "notifications.delete", self.db.collection("notifications").document(doc_id)
+        )
+        reminder_cache.remove(doc_id)
 
-        await interaction.followup.send(f"🗑️ 已移除提醒 index `{index}`", ephemeral=True)
-        await send_notify_log(
+        await interaction.followup.send(
+            f"🗑️ 已移除提醒 `{short_id(doc_id)}`", ephemeral=True
+        )
+        send_notify_log(
             self.bot,
-            f"{interaction.user} 移除了提醒 index `{index}`（doc: {doc_id}）in guild {interaction.guild_id}",
+            f"{interaction.user} 移除了提醒 `{short_id(doc_id)}`（doc: {doc_id}）in guild {interaction.guild_id}",
             guild_id=interaction.guild_id,
         )
 
-    @app_commands.command(name="edit_notify", description="編輯提醒內容 (by index)")
+    @app_commands.command(name="edit_notify", description="編輯提醒內容 (by 提醒 ID)")
     @app_commands.describe(
-        index="提醒編號",
+        reminder_id="提醒 ID（可輸入關鍵字搜尋）",
         date="新日期(YYYY-MM-DD)",
         time="新時間(HH:MM)",
         message="新提醒內容",
@@ -186,7 +221,7 @@ class Notify(Cog):
     async def edit_notify(
         self,
         interaction: discord.Interaction,
-        index: int,
+        reminder_id: str,
         date: str = None,
         time: str = None,
         message: str = None,
@@ -199,19 +234,13 @@ class Notify(Cog):
             await interaction.followup.send("🚫 你沒有權限編輯提醒")
             return
 
-        docs = (
-            self.db.collection("notifications")
-            .where("guild_id", "==", str(interaction.guild_id))
-            .order_by("datetime")
-            .stream()
-        )
-        doc_list = list(docs)
-        if index < 0 or index >= len(doc_list):
-            await interaction.followup.send("❌ 無效的 index")
+        found = await self.resolve_reminder(interaction.guild_id, reminder_id)
+        if not found:
+            await interaction.followup.send("❌ 找不到該提醒 ID")
             return
 
-        doc_ref = doc_list[index].reference
-        old_data = doc_list[index].to_dict()
+        doc_id, old_data = found
+        doc_ref = self.db.collection("notifications").document(doc_id)
         updated = {}
 
         if message:
@@ -225,8 +254,9 @@ class Notify(Cog):
             updated["channel_id"] = channel.id
         if date or time:
             try:
-                date_str = date or old_data["datetime"].strftime("%Y-%m-%d")
-                time_str = time or old_data["datetime"].strftime("%H:%M")
+                old_dt = old_data["datetime"].astimezone(TIMEZONE)
+                date_str = date or old_dt.strftime("%Y-%m-%d")
+                time_str = time or old_dt.strftime("%H:%M")
                 dt = TIMEZONE.localize(
                     datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
                 )
@@ -239,15 +269,34 @@ class Notify(Cog):
             await interaction.followup.send("⚠️ 請填寫至少一項欄位")
             return
 
-        doc_ref.update(updated)
+        await async_db.update("notifications.update", doc_ref, updated)
+        reminder_cache.put(doc_id, {**old_data, **updated})
         await interaction.followup.send("✅ 提醒已更新")
 
-        await send_notify_log(
+        send_notify_log(
             self.bot,
-            f"{interaction.user} 編輯提醒 index `{index}` in guild {interaction.guild_id}，更新欄位: {list(updated.keys())}",
+            f"{interaction.user} 編輯提醒 `{short_id(doc_id)}` in guild {interaction.guild_id}，更新欄位: {list(updated.keys())}",
             guild_id=interaction.guild_id,
         )
 
+    @remove_notify.autocomplete("reminder_id")
+    @edit_notify.autocomplete("reminder_id")
+    async def reminder_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ):
+        current = current.strip().lower()
+        choices = []
+        for doc_id, data in reminder_cache.list(interaction.guild_id):
+            label = reminder_cache.label(doc_id, data)
+            if current and current not in label.lower():
+                continue
+            choices.append(
+                app_commands.Choice(name=label[:100], value=short_id(doc_id))
+            )
+            if len(choices) >= 25:
+                break
+        return choices
+
     async def cog_load(self):
         for gid in GUILD_IDS:
             guild = discord.Object(id=gid)
@@ -1,9 +1,14 @@
 import discord
+import time
 import uuid
+from datetime import datetime, timezone
 from discord import app_commands
 from discord.ext.commands import Cog
 from firebase_admin import firestore
 from config import GUILD_IDS
+import async_db
+from roster import roster
+import redeem_index
 
 ENABLE_DIRECT_REDEEM = False
 
@@ -17,13 +22,23 @@ class RedeemCommand(Cog):
         name="redeem_submit",
         description="Submit gift code / 提交兌換碼（呱呱要開功能）",
     )
-    @app_commands.describe(code="禮包碼", player_id="玩家 ID(可選)")
+    @app_commands.describe(
+        code="禮包碼（多組用逗號分隔）",
+        player_id="玩家 ID(可選)",
+        force="忽略先前記錄的無效/過期結果，重新嘗試這些兌換碼",
+    )
     async def redeem_submit(
-        self, interaction: discord.Interaction, code: str, player_id: str = None
+        self,
+        interaction: discord.Interaction,
+        code: str,
+        player_id: str = None,
+        force: bool = False,
     ):
         await interaction.response.defer(thinking=True)
 
-        if len(code) < 6 or code.isdigit():
+        codes = list(dict.fromkeys(c.strip() for c in code.split(",") if c.strip()))
+        invalid = [c for c in codes if len(c) < 6 or c.isdigit()]
+        if not codes or invalid:
             await interaction.followup.send(
                 "❌ Invalid code format. Code must be at least 6 characters and contain letters.",
                 ephemeral=True,
@@ -31,29 +46,35 @@ class RedeemCommand(Cog):
             return
 
         guild_id = str(interaction.guild_id)
+        batch_id = str(uuid.uuid4())[:8]
+
+        if force:
+            await async_db.run(
+                "redeem_codes.clear", redeem_index.clear_dead_codes, self.db, codes
+            )
 
         if not player_id:
-            docs = (
-                self.db.collection("ids")
-                .document(guild_id)
-                .collection("players")
-                .stream()
+            player_ids = await roster.player_ids(guild_id)
+
+            # 同一玩家的多組兌換碼放在同一個 batch，worker 會合併成一次登入
+            tasks, notes = await self.build_tasks(
+                interaction.channel.id, batch_id, codes, player_ids
             )
-            player_ids = [doc.to_dict()["player_id"] for doc in docs]
-            batch_id = str(uuid.uuid4())[:8]
-
-            for pid in player_ids:
-                task = {
-                    "code": code,
-                    "player_id": pid,
-                    "channel_id": interaction.channel.id,
-                    "status": "pending",
-                    "batch_id": batch_id,
-                }
-                self.db.collection("redeem_tasks").add(task)
+            if not tasks:
+                await interaction.followup.send(
+                    "\n".join(notes + ["Nothing left to redeem."]), ephemeral=True
+                )
+                return
+            count, elapsed = await self.submit_tasks(tasks)
 
             await interaction.followup.send(
-                "All players submitted. Waiting for redeem result...",
+                "\n".join(
+                    notes
+                    + [
+                        f"All players submitted: {count} task(s) for {len(player_ids)} player(s) "
+                        f"(batch `{batch_id}`, {elapsed:.2f}s). Waiting for redeem result..."
+                    ]
+                ),
                 ephemeral=True,
             )
         else:
@@ -64,44 +85,136 @@ class RedeemCommand(Cog):
                 )
                 return
 
-            docs = (
-                self.db.collection("ids")
-                .document(guild_id)
-                .collection("players")
-                .where("player_id", "==", player_id)
-                .stream()
-            )
-            found = any(True for _ in docs)
-
-            if not found:
-                self.db.collection("ids").document(guild_id).collection(
-                    "players"
-                ).document(player_id).set({"player_id": player_id})
+            if not await roster.contains(guild_id, player_id):
+                await async_db.set_doc(
+                    "ids.add",
+                    roster.players_ref(guild_id).document(player_id),
+                    {"player_id": player_id},
+                )
+                roster.added(guild_id, player_id)
                 await interaction.followup.send(
                     f"📌 Player ID `{player_id}` added to Firestore.",
                     ephemeral=True,
                 )
 
-            task = {
-                "code": code,
-                "player_id": player_id,
-                "channel_id": interaction.channel.id,
-                "status": "pending",
-                "batch_id": None,
-            }
-            self.db.collection("redeem_tasks").add(task)
+            tasks, notes = await self.build_tasks(
+                interaction.channel.id, batch_id, codes, [player_id]
+            )
+            if not tasks:
+                await interaction.followup.send(
+                    "\n".join(notes + ["Nothing left to redeem."]), ephemeral=True
+                )
+                return
+            await self.submit_tasks(tasks)
 
             await interaction.followup.send(
-                f"{player_id} -> Waiting for redeem result...",
+                "\n".join(notes + [f"{player_id} -> Waiting for redeem result..."]),
                 ephemeral=True,
             )
 
+    async def build_tasks(self, channel_id, batch_id, codes, player_ids):
+        """建立兌換任務，先查兌換結果索引：略過已確認無效/過期的兌換碼與已領取的玩家
+        回傳 (tasks, 給使用者的說明)"""
+        notes = []
+        dead = await async_db.run(
+            "redeem_index.codes", redeem_index.lookup_dead_codes, self.db, codes
+        )
+        for c, reason in dead.items():
+            notes.append(f"⛔ `{c}` -> {reason}, skipped.")
+        codes = [c for c in codes if c not in dead]
+
+        pairs = [(c, pid) for pid in player_ids for c in codes]
+        done = set()
+        if pairs:
+            done = await async_db.run(
+                "redeem_index.lookup", redeem_index.lookup_done, self.db, pairs
+            )
+        if done:
+            notes.append(f"⏭️ {len(done)} already redeemed, skipped.")
+
+        tasks = [
+            {
+                "code": c,
+                "player_id": pid,
+                "channel_id": channel_id,
+                "status": "pending",
+                "batch_id": batch_id,
+            }
+            for c, pid in pairs
+            if (c, pid) not in done
+        ]
+        return tasks, notes
+
+    async def submit_tasks(self, tasks):
+        """以 batched write 一次寫入所有兌換任務，回傳 (筆數, 花費秒數)"""
+        start = time.perf_counter()
+        collection = self.db.collection("redeem_tasks")
+        count = await async_db.commit_sets(
+            "redeem_tasks.batch_add",
+            self.db,
+            [(collection.document(), task) for task in tasks],
+        )
+        return count, time.perf_counter() - start
+
+    @app_commands.command(
+        name="redeem_stats", description="Show redeem worker stats / 顯示兌換 Worker 統計"
+    )
+    async def redeem_stats(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        docs = await async_db.stream(
+            "worker_stats.list", self.db.collection("worker_stats")
+        )
+        if not docs:
+            await interaction.followup.send("📭 No worker stats yet.", ephemeral=True)
+            return
+
+        now = datetime.now(timezone.utc)
+        lines = []
+        for doc in docs:
+            data = doc.to_dict()
+            updated = data.get("updated_at")
+            age = f"{(now - updated).total_seconds():.0f}s ago" if updated else "?"
+            results = data.get("results", {})
+            total = sum(sum(r.values()) for r in results.values())
+            failed = sum(results.get("fail", {}).values())
+            rate = f"{failed / total:.0%}" if total else "-"
+            lines.append(
+                f"[{doc.id}] {data.get('backend')} | updated {age} | "
+                f"inflight {data.get('inflight', 0)}"
+            )
+            lines.append(f"  results: {total} total, {failed} failed ({rate})")
+            top_reasons = sorted(
+                results.get("fail", {}).items(), key=lambda kv: kv[1], reverse=True
+            )[:5]
+            for reason, count in top_reasons:
+                lines.append(f"    {reason}: {count}")
+            for stage, stat in sorted(data.get("stages", {}).items()):
+                lines.append(
+                    f"  {stage}: n={stat['count']} p50={stat['p50']:.2f}s "
+                    f"p95={stat['p95']:.2f}s max={stat['max']:.2f}s"
+                )
+            batches = data.get("batches", [])
+            if batches:
+                tasks = sum(b["tasks"] for b in batches)
+                seconds = sum(b["seconds"] for b in batches)
+                throughput = tasks / seconds * 60 if seconds else 0
+                lines.append(
+                    f"  last {len(batches)} batch(es): {tasks} task(s), "
+                    f"{throughput:.1f} task/min"
+                )
+
+        text = "\n".join(lines)
+        await interaction.followup.send(
+            f"📈 Redeem worker stats\n```\n{text[:1850]}\n```", ephemeral=True
+        )
+
     async def cog_load(self):
         for gid in GUILD_IDS:
             guild = discord.Object(id=gid)
             if ENABLE_DIRECT_REDEEM:
                 self.bot.tree.add_command(self.redeem, guild=guild)
             self.bot.tree.add_command(self.redeem_submit, guild=guild)
+            self.bot.tree.add_command(self.redeem_stats, guild=guild)
 
 
 async def setup(bot):
@@ -0,0 +1,54 @@
+# command_sync.py
+import hashlib
+import json
+
+import discord
+
+import async_db
+
+# 每個伺服器上次同步的指令指紋存在這份文件，重啟時只同步指令有變動的伺服器
+SYNC_DOC = ("bot_meta", "command_sync")
+GLOBAL_KEY = "global"
+
+
+def fingerprint(tree, guild=None):
+    """以指令的 to_dict()（名稱、描述、參數、選項）計算指紋，順序不影響結果"""
+    payload = sorted(
+        (cmd.to_dict() for cmd in tree.get_commands(guild=guild)),
+        key=lambda c: c["name"],
+    )
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def sync_changed(bot, db, guild_ids, force=False):
+    """只同步指紋改變的全域/伺服器指令，回傳實際同步的目標 list
+    呼叫前全域 tree 應已清空，全域只用來把 Discord 上舊的全域指令清掉一次"""
+    ref = db.collection(SYNC_DOC[0]).document(SYNC_DOC[1])
+    snapshot = await async_db.get_doc("bot_meta.get", ref)
+    stored = snapshot.to_dict().get("fingerprints", {}) if snapshot.exists else {}
+
+    targets = [(GLOBAL_KEY, None)] + [
+        (str(gid), discord.Object(id=gid)) for gid in guild_ids
+    ]
+    fingerprints = {}
+    synced = []
+    for key, guild in targets:
+        current = fingerprint(bot.tree, guild)
+        if not force and stored.get(key) == current:
+            fingerprints[key] = current
+            continue
+        try:
+            await bot.tree.sync(guild=guild)
+        except discord.HTTPException as e:
+            # 同步失敗就不記錄指紋，下次啟動會再試
+            print(f"❌ Failed to sync commands for {key}: {e}")
+            continue
+        fingerprints[key] = current
+        synced.append(key)
+
+    if fingerprints != stored:
+        await async_db.set_doc(
+            "bot_meta.set", ref, {"fingerprints": fingerprints}
+        )
+    return synced
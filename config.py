@@ -9,7 +9,11 @@ def parse_list(env_str):
 GUILD_IDS = parse_list(os.getenv("GUILD_IDS", ""))
 LOG_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_ID", "0"))
 LOG_FIRESTORE_ENABLED = os.getenv("LOG_FIRESTORE_ENABLED", "true").lower() == "true"
+# 操作紀錄合併送出的間隔秒數
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "5"))
 ENABLE_DEBUG_COMMANDS = os.getenv("ENABLE_DEBUG_COMMANDS", "false").lower() == "true"
+# 忽略已儲存的指令指紋，啟動時強制同步所有伺服器的 Slash 指令
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "false").lower() == "true"
 
 # 權限管理：這個建議仍寫死在程式碼中（較安全），也比較不需要調整
 ROLE_PERMISSIONS = {
@@ -27,3 +31,72 @@ ROLE_PERMISSIONS = {
         1126409399351644171,
     ],
 }
+
+# Redeem worker：瀏覽器 session 池
+REDEEM_POOL_SIZE = int(os.getenv("REDEEM_POOL_SIZE", "2"))
+REDEEM_SESSION_MAX_USES = int(os.getenv("REDEEM_SESSION_MAX_USES", "50"))
+REDEEM_TIMEOUT = int(os.getenv("REDEEM_TIMEOUT", "90"))
+# 點擊兌換後等待結果訊息的上限秒數（訊息出現就立即繼續）
+REDEEM_RESULT_TIMEOUT = float(os.getenv("REDEEM_RESULT_TIMEOUT", "3"))
+# 結果判斷改讀網頁文字，截圖只作為佐證（預設不存）
+REDEEM_SAVE_SCREENSHOTS = (
+    os.getenv("REDEEM_SAVE_SCREENSHOTS", "false").lower() == "true"
+)
+# 截圖只存結果視窗區塊，壓縮後於背景寫入；超過保存天數或總容量時刪除最舊的
+REDEEM_EVIDENCE_DIR = os.getenv("REDEEM_EVIDENCE_DIR", "screenshots")
+REDEEM_EVIDENCE_FORMAT = os.getenv("REDEEM_EVIDENCE_FORMAT", "webp").lower()
+REDEEM_EVIDENCE_QUALITY = int(os.getenv("REDEEM_EVIDENCE_QUALITY", "60"))
+REDEEM_EVIDENCE_MAX_AGE_DAYS = int(os.getenv("REDEEM_EVIDENCE_MAX_AGE_DAYS", "14"))
+REDEEM_EVIDENCE_MAX_MB = int(os.getenv("REDEEM_EVIDENCE_MAX_MB", "500"))
+REDEEM_EVIDENCE_FAILURES_ONLY = (
+    os.getenv("REDEEM_EVIDENCE_FAILURES_ONLY", "false").lower() == "true"
+)
+# 兌換紀錄（JSONL）：超過大小就壓縮成 .jsonl.gz，只保留最新的幾個
+REDEEM_RUN_LOG_DIR = os.getenv("REDEEM_RUN_LOG_DIR", "logs")
+REDEEM_RUN_LOG_MAX_MB = int(os.getenv("REDEEM_RUN_LOG_MAX_MB", "20"))
+REDEEM_RUN_LOG_BACKUPS = int(os.getenv("REDEEM_RUN_LOG_BACKUPS", "20"))
+
+# Redeem worker：同時進行的兌換數（全域上限 / 單一批次上限）
+REDEEM_MAX_CONCURRENCY = int(os.getenv("REDEEM_MAX_CONCURRENCY", str(REDEEM_POOL_SIZE)))
+REDEEM_BATCH_CONCURRENCY = max(
+    1, int(os.getenv("REDEEM_BATCH_CONCURRENCY", str(REDEEM_MAX_CONCURRENCY)))
+)
+
+# Redeem worker：兌換方式（selenium = 開瀏覽器操作網頁，http = 直接呼叫網站 API）
+REDEEM_BACKEND = os.getenv("REDEEM_BACKEND", "selenium").lower()
+REDEEM_API_URL = os.getenv(
+    "REDEEM_API_URL", "https://wos-giftcode-api.centurygame.com"
+)
+# 簽章用的金鑰不放在程式碼中；http 模式未設定時 worker 拒絕啟動
+REDEEM_API_SECRET = os.getenv("REDEEM_API_SECRET", "")
+
+# Redeem worker：收到新任務後等待同一次提交其餘任務的秒數
+REDEEM_INTAKE_DEBOUNCE = float(os.getenv("REDEEM_INTAKE_DEBOUNCE", "1"))
+
+# Redeem worker：多台 worker 共用同一個佇列時的識別與租約秒數
+REDEEM_WORKER_ID = os.getenv("REDEEM_WORKER_ID", "")
+REDEEM_LEASE_SECONDS = int(os.getenv("REDEEM_LEASE_SECONDS", "120"))
+
+# 「兌換碼不存在」的記錄保留分鐘數，之後重新提交會再試一次（過期的兌換碼永久略過）
+REDEEM_INVALID_CODE_TTL_MINUTES = int(
+    os.getenv("REDEEM_INVALID_CODE_TTL_MINUTES", "30")
+)
+
+# Redeem worker：本機 /metrics 端點的 port（0 = 關閉）與寫入 Firestore 統計摘要的間隔秒數
+REDEEM_METRICS_PORT = int(os.getenv("REDEEM_METRICS_PORT", "9108"))
+REDEEM_STATS_INTERVAL = int(os.getenv("REDEEM_STATS_INTERVAL", "60"))
+# Redeem worker：批次進度訊息最短編輯間隔秒數（避免撞到 Discord 編輯頻率限制）
+REDEEM_PROGRESS_INTERVAL = float(os.getenv("REDEEM_PROGRESS_INTERVAL", "2"))
+
+# Firestore 同步 API 使用的執行緒數（bot 端）
+FIRESTORE_MAX_WORKERS = int(os.getenv("FIRESTORE_MAX_WORKERS", "8"))
+
+# 提醒排程：啟動時補發停機期間錯過的提醒（分鐘）
+NOTIFY_CATCHUP_MINUTES = int(os.getenv("NOTIFY_CATCHUP_MINUTES", "60"))
+
+# 提醒發送：同時發送的上限與頻道快取數量
+NOTIFY_MAX_CONCURRENCY = int(os.getenv("NOTIFY_MAX_CONCURRENCY", "10"))
+CHANNEL_CACHE_SIZE = int(os.getenv("CHANNEL_CACHE_SIZE", "256"))
+
+# 列表指令每頁顯示筆數
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "20"))
@@ -0,0 +1,241 @@
+# evidence_store.py
+import io
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from PIL import Image
+
+# 每寫入幾張就檢查一次保留政策
+RETENTION_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evidence (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    code TEXT,
+    kind TEXT NOT NULL,
+    is_failed INTEGER NOT NULL,
+    reason TEXT,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evidence_player ON evidence (player_id, created_at);
+CREATE INDEX IF NOT EXISTS evidence_batch ON evidence (batch_id, created_at);
+CREATE INDEX IF NOT EXISTS evidence_created ON evidence (created_at);
+"""
+
+
+class EvidenceStore:
+    """兌換結果截圖：壓縮、寫檔與建立索引都在背景執行緒進行，不佔用兌換流程的時間
+
+    檔案存在 {root}/{batch_id}/，索引在 {root}/index.sqlite3，
+    依 max_age_days / max_bytes 刪除最舊的檔案，failures_only 時只保留失敗的截圖。
+    """
+
+    def __init__(
+        self,
+        root,
+        fmt="webp",
+        quality=60,
+        max_age_days=14,
+        max_bytes=500 * 1024 * 1024,
+        failures_only=False,
+    ):
+        self.root = root
+        self.fmt = fmt.lower()
+        self.quality = quality
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.max_bytes = max_bytes or None
+        self.failures_only = failures_only
+        self.index_path = os.path.join(root, "index.sqlite3")
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ext(self):
+        return "jpg" if self.fmt == "jpeg" else self.fmt
+
+    def capture(self, png, batch_id, player_id, code, kind, is_failed, reason=""):
+        """排入背景寫入並回傳之後的檔案路徑；png 為 Selenium 截圖的 PNG bytes"""
+        if self.failures_only and not is_failed:
+            return None
+        batch_id = batch_id or "default"
+        created_at = time.time()
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(created_at))
+        suffix = (reason or "Failed") if is_failed else "Success"
+        suffix = suffix.replace(" ", "_").replace(":", "")[:40]
+        safe_code = (code or "").replace("/", "_")
+        path = os.path.join(
+            self.root,
+            batch_id,
+            f"{player_id}_{safe_code}_{stamp}_{kind}_{suffix}.{self.ext}",
+        )
+        self._ensure_thread()
+        self._queue.put(
+            {
+                "png": png,
+                "path": path,
+                "batch_id": batch_id,
+                "player_id": player_id,
+                "code": code,
+                "kind": kind,
+                "is_failed": is_failed,
+                "reason": reason,
+                "created_at": created_at,
+            }
+        )
+        return path
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="evidence-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _connect(self):
+        os.makedirs(self.root, exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        written = 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(conn, item)
+                written += 1
+                if written % RETENTION_EVERY == 0:
+                    self._apply_retention(conn)
+            except Exception as e:
+                print(f"⚠️ Failed to store evidence: {type(e).__name__}: {e}")
+        self._apply_retention(conn)
+        conn.close()
+
+    def _write(self, conn, item):
+        img = Image.open(io.BytesIO(item["png"])).convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format=self.fmt.upper(), quality=self.quality)
+
+        path = item["path"]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(buf.getvalue())
+
+        conn.execute(
+            "INSERT INTO evidence (batch_id, player_id, code, kind, is_failed, reason,"
+            " path, bytes, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                item["batch_id"],
+                item["player_id"],
+                item["code"],
+                item["kind"],
+                int(item["is_failed"]),
+                item["reason"],
+                path,
+                buf.tell(),
+                item["created_at"],
+            ),
+        )
+        conn.commit()
+
+    def _delete(self, conn, rows):
+        for row_id, path in rows:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            conn.execute("DELETE FROM evidence WHERE id = ?", (row_id,))
+
+    def _apply_retention(self, conn):
+        if self.max_age:
+            expired = conn.execute(
+                "SELECT id, path FROM evidence WHERE created_at < ?",
+                (time.time() - self.max_age,),
+            ).fetchall()
+            self._delete(conn, expired)
+
+        if self.max_bytes:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM evidence"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                oldest = []
+                for row_id, path, size in conn.execute(
+                    "SELECT id, path, bytes FROM evidence ORDER BY created_at"
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    oldest.append((row_id, path))
+                    total -= size
+                self._delete(conn, oldest)
+        conn.commit()
+
+    def find(self, player_id=None, batch_id=None, limit=50):
+        """依玩家或批次查詢截圖，回傳 dict list（新到舊）"""
+        if not os.path.exists(self.index_path):
+            return []
+        clauses, args = [], []
+        if player_id:
+            clauses.append("player_id = ?")
+            args.append(player_id)
+        if batch_id:
+            clauses.append("batch_id = ?")
+            args.append(batch_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = sqlite3.connect(self.index_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM evidence {where} ORDER BY created_at DESC LIMIT ?",
+                (*args, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """等待佇列中的截圖寫完"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+
+def main():
+    # python evidence_store.py [--player ID] [--batch BATCH_ID]
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from config import REDEEM_EVIDENCE_DIR
+
+    args = sys.argv[1:]
+    filters = {"player_id": None, "batch_id": None}
+    for flag, key in (("--player", "player_id"), ("--batch", "batch_id")):
+        if flag in args and args.index(flag) + 1 < len(args):
+            filters[key] = args[args.index(flag) + 1]
+
+    for row in EvidenceStore(REDEEM_EVIDENCE_DIR).find(**filters):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["created_at"]))
+        status = row["reason"] if row["is_failed"] else "Success"
+        print(
+            f"{stamp} [{row['batch_id']}] {row['player_id']} {row['code']} "
+            f"{status}: {row['path']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# http_redeem.py
+import asyncio
+import hashlib
+import time
+
+import aiohttp
+
+import redeem_metrics
+
+# 兌換網站前端實際呼叫的 API 回應碼
+ERR_CODE_REASON_MAP = {
+    20000: "",  # SUCCESS
+    40008: "Redeemed",  # RECEIVED.
+    40011: "Redeemed",  # SAME TYPE EXCHANGE.
+    40014: "Invalid Code",  # CDK NOT FOUND.
+    40007: "Expired",  # TIME ERROR.
+    40005: "Unavailable",  # USED.（兌換次數已達上限）
+}
+MSG_REASON_MAP = {
+    "SUCCESS": "",
+    "RECEIVED.": "Redeemed",
+    "SAME TYPE EXCHANGE.": "Redeemed",
+    "CDK NOT FOUND.": "Invalid Code",
+    "TIME ERROR.": "Expired",
+    "USED.": "Unavailable",
+    "ROLE NOT EXIST.": "Invalid",
+}
+RETRY_MSGS = {"TIMEOUT RETRY."}
+
+
+class RedeemApiError(Exception):
+    pass
+
+
+class HttpRedeemClient:
+    """直接呼叫兌換網站的 API（不開瀏覽器），共用一個 aiohttp session
+
+    log_result(code, player_id, batch_id, is_failed, reason) 在執行緒中呼叫，用來寫入兌換紀錄；
+    不給時只回傳結果（例如對 mock_redeem_api.py 測試時）。
+    """
+
+    def __init__(
+        self,
+        base_url,
+        secret,
+        max_connections=10,
+        timeout=15,
+        retries=2,
+        log_result=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret
+        self.log_result = log_result
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    def _sign(self, params):
+        query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return hashlib.md5((query + self.secret).encode("utf-8")).hexdigest()
+
+    async def _post(self, path, params):
+        params = dict(params, time=int(time.time() * 1000))
+        params["sign"] = self._sign(params)
+        session = self._get_session()
+
+        for attempt in range(self.retries + 1):
+            async with session.post(f"{self.base_url}{path}", data=params) as resp:
+                if resp.status == 429 and attempt < self.retries:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                if resp.status != 200:
+                    raise RedeemApiError(f"HTTP {resp.status}")
+                payload = await resp.json(content_type=None)
+
+            if str(payload.get("msg", "")).upper() in RETRY_MSGS and attempt < self.retries:
+                await asyncio.sleep(2 ** attempt)
+                continue
+            return payload
+
+    def _classify(self, payload):
+        err_code = payload.get("err_code")
+        if err_code in ERR_CODE_REASON_MAP:
+            return ERR_CODE_REASON_MAP[err_code]
+        msg = str(payload.get("msg", "")).upper()
+        if msg in MSG_REASON_MAP:
+            return MSG_REASON_MAP[msg]
+        return "Unknown Reason"
+
+    async def redeem_codes(self, codes, player_id, batch_id="default"):
+        """同一個玩家只查詢一次角色，再依序兌換多組兌換碼，回傳與 codes 順序相同的結果 list"""
+        try:
+            with redeem_metrics.timer("login"):
+                player = await self._post("/api/player", {"fid": player_id})
+        except Exception as e:
+            return [self._exception_outcome(code, player_id, e, []) for code in codes]
+
+        login_lines = [f"{player_id} player API:\n{player}\n\n"]
+        if player.get("code") != 0:
+            reason = self._classify(player)
+            reason = "Invalid" if reason in ("", "Unknown Reason") else reason
+            return [
+                await self._finish(code, player_id, batch_id, reason, login_lines)
+                for code in codes
+            ]
+
+        outcomes = []
+        for code in codes:
+            try:
+                with redeem_metrics.timer("submit"):
+                    result = await self._post(
+                        "/api/gift_code", {"fid": player_id, "cdk": code}
+                    )
+            except Exception as e:
+                outcomes.append(self._exception_outcome(code, player_id, e, []))
+                continue
+            detail_lines = [f"{player_id} [{code}] gift_code API:\n{result}\n\n"]
+            outcomes.append(
+                await self._finish(
+                    code, player_id, batch_id, self._classify(result), detail_lines
+                )
+            )
+        return outcomes
+
+    def _exception_outcome(self, code, player_id, e, detail_lines):
+        return {
+            "player_id": player_id,
+            "code": code,
+            "result": "fail",
+            "reason": f"Exception: {type(e).__name__}: {e}",
+            "ocr_lines": detail_lines,
+            "exception": True,
+        }
+
+    async def _finish(self, code, player_id, batch_id, reason, detail_lines):
+        is_failed = reason != ""
+        if self.log_result is not None:
+            await asyncio.to_thread(
+                self.log_result, code, player_id, batch_id, is_failed, reason
+            )
+        return {
+            "player_id": player_id,
+            "code": code,
+            "result": "fail" if is_failed else "success",
+            "reason": reason if is_failed else "Success",
+            "ocr_lines": detail_lines,
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,78 @@
+# mock_redeem_api.py
+import hashlib
+import sys
+
+from aiohttp import web
+
+# REDEEM_API_SECRET 指向本伺服器時使用的金鑰
+DEFAULT_SECRET = "mock-secret"
+# 兌換碼 -> (msg, err_code)，與兌換網站 API 的回應相同；其他兌換碼一律回傳 CDK NOT FOUND.
+DEFAULT_CODES = {
+    "SUCCESS": ("SUCCESS", 20000),
+    "REDEEMED": ("RECEIVED.", 40008),
+    "SAMETYPE": ("SAME TYPE EXCHANGE.", 40011),
+    "EXPIRED": ("TIME ERROR.", 40007),
+    "USEDUP": ("USED.", 40005),
+}
+NOT_FOUND = ("CDK NOT FOUND.", 40014)
+# 伺服器收到的請求紀錄（測試用來檢查簽章與呼叫順序）
+REQUESTS = web.AppKey("requests", list)
+
+
+def sign(params, secret):
+    """與 http_redeem.HttpRedeemClient._sign 相同：依 key 排序串接後加上金鑰取 MD5"""
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return hashlib.md5((query + secret).encode("utf-8")).hexdigest()
+
+
+def make_app(secret=DEFAULT_SECRET, codes=None, missing_players=()):
+    """建立模擬 /api/player 與 /api/gift_code 的 aiohttp app；收到的請求記錄在 app[REQUESTS]"""
+    codes = DEFAULT_CODES if codes is None else codes
+    app = web.Application()
+    app[REQUESTS] = []
+
+    async def read_params(request):
+        params = dict(await request.post())
+        received = params.pop("sign", "")
+        signed = received == sign(params, secret)
+        app[REQUESTS].append({"path": request.path, "params": params, "signed": signed})
+        return params, signed
+
+    def reply(msg, err_code, data=None):
+        return web.json_response(
+            {
+                "code": 0 if err_code in ("", 20000) else 1,
+                "data": data or {},
+                "msg": msg,
+                "err_code": err_code,
+            }
+        )
+
+    async def player(request):
+        params, signed = await read_params(request)
+        if not signed:
+            return reply("Sign Error", 0)
+        if params.get("fid") in missing_players:
+            return reply("role not exist.", 40004)
+        return reply("success", "", {"fid": params.get("fid"), "nickname": "mock"})
+
+    async def gift_code(request):
+        params, signed = await read_params(request)
+        if not signed:
+            return reply("Sign Error", 0)
+        msg, err_code = codes.get(params.get("cdk"), NOT_FOUND)
+        return reply(msg, err_code)
+
+    app.router.add_post("/api/player", player)
+    app.router.add_post("/api/gift_code", gift_code)
+    return app
+
+
+def main():
+    # python mock_redeem_api.py [port]，再設定 REDEEM_API_URL=http://127.0.0.1:<port>
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    web.run_app(make_app(), host="127.0.0.1", port=port)
+
+
+if __name__ == "__main__":
+    main()
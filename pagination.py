@@ -0,0 +1,108 @@
+# pagination.py
+import discord
+
+import async_db
+from config import LIST_PAGE_SIZE
+
+# Discord 單則訊息上限
+MESSAGE_LIMIT = 2000
+
+
+class FirestorePaginator(discord.ui.View):
+    """以 Firestore cursor（start_after + limit）分頁顯示查詢結果，每頁只讀取該頁的文件"""
+
+    def __init__(self, query, render, title, label, author_id, empty_text):
+        super().__init__(timeout=300)
+        self.query = query  # 必須已 order_by
+        self.render = render  # (doc, index) -> str
+        self.title = title
+        self.label = label
+        self.author_id = author_id
+        self.empty_text = empty_text
+        self.page_size = LIST_PAGE_SIZE
+        self.page = 0
+        # page_starts[i] 是第 i 頁的 start_after 游標（第 0 頁為 None）
+        # page_offsets[i] 是第 i 頁第一筆的序號
+        self.page_starts = [None]
+        self.page_offsets = [0]
+        self.docs = []
+        self.lines = []
+        self.has_next = False
+        self.message = None
+
+    async def load_page(self):
+        query = self.query
+        cursor = self.page_starts[self.page]
+        if cursor is not None:
+            query = query.start_after(cursor)
+        # 多讀一筆用來判斷是否還有下一頁
+        docs = await async_db.stream(self.label, query.limit(self.page_size + 1))
+
+        # 依字數上限決定這一頁實際放幾筆，下一頁的游標從最後一筆實際顯示的文件開始
+        offset = self.page_offsets[self.page]
+        budget = MESSAGE_LIMIT - len(self.header())
+        self.docs, self.lines = [], []
+        for i, doc in enumerate(docs[: self.page_size]):
+            line = self.render(doc, offset + i)
+            if self.lines and len(line) + 1 > budget:
+                break
+            line = line[: budget - 1]
+            budget -= len(line) + 1
+            self.docs.append(doc)
+            self.lines.append(line)
+
+        self.has_next = len(docs) > len(self.docs)
+        if self.has_next and len(self.page_starts) == self.page + 1:
+            self.page_starts.append(self.docs[-1])
+            self.page_offsets.append(offset + len(self.docs))
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = not self.has_next
+
+    def header(self):
+        return f"{self.title}（第 {self.page + 1} 頁）"
+
+    def content(self):
+        if not self.docs:
+            return self.empty_text
+        return self.header() + "\n" + "\n".join(self.lines)
+
+    async def send(self, interaction: discord.Interaction):
+        await self.load_page()
+        if not self.docs:
+            await interaction.followup.send(self.empty_text, ephemeral=True)
+            return
+        if not self.has_next:
+            # 只有一頁時不需要按鈕
+            await interaction.followup.send(self.content(), ephemeral=True)
+            return
+        self.message = await interaction.followup.send(
+            self.content(), view=self, ephemeral=True
+        )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def turn(self, interaction: discord.Interaction, step: int):
+        self.page = max(0, self.page + step)
+        await self.load_page()
+        await interaction.response.edit_message(content=self.content(), view=self)
+
+    @discord.ui.button(label="◀ 上一頁", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self.turn(interaction, -1)
+
+    @discord.ui.button(label="下一頁 ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, 1)
+
+    async def on_timeout(self):
+        if self.message is None:
+            return
+        self.previous_page.disabled = True
+        self.next_page.disabled = True
+        try:
+            await self.message.edit(view=self)
+        except discord.HTTPException:
+            pass
@@ -1,5 +1,7 @@
 # redeem.py
+import io
 import os
+import socket
 import sys
 import time
 import pytesseract
@@ -7,10 +9,13 @@ import json
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 from PIL import Image
 import firebase_admin
@@ -21,6 +26,27 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# config 在 load_dotenv() 之後才匯入，才讀得到 .env 的設定
+from config import (
+    REDEEM_SAVE_SCREENSHOTS,
+    REDEEM_RESULT_TIMEOUT,
+    REDEEM_EVIDENCE_DIR,
+    REDEEM_EVIDENCE_FORMAT,
+    REDEEM_EVIDENCE_QUALITY,
+    REDEEM_EVIDENCE_MAX_AGE_DAYS,
+    REDEEM_EVIDENCE_MAX_MB,
+    REDEEM_EVIDENCE_FAILURES_ONLY,
+    REDEEM_RUN_LOG_DIR,
+    REDEEM_RUN_LOG_MAX_MB,
+    REDEEM_RUN_LOG_BACKUPS,
+    REDEEM_WORKER_ID,
+)
+from evidence_store import EvidenceStore
+from run_log import RunLog
+from roster import parse_id_lines
+import redeem_index
+import redeem_metrics
+
 cred_json = json.loads(os.environ.get("FIREBASE_CREDENTIALS", "{}"))
 if "private_key" in cred_json:
     cred_json["private_key"] = cred_json["private_key"].replace("\\n", "\n")
@@ -31,46 +57,33 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
+# 截圖壓縮與寫檔在背景執行緒進行，結束前呼叫 evidence.close() 等待寫完
+evidence = EvidenceStore(
+    REDEEM_EVIDENCE_DIR,
+    fmt=REDEEM_EVIDENCE_FORMAT,
+    quality=REDEEM_EVIDENCE_QUALITY,
+    max_age_days=REDEEM_EVIDENCE_MAX_AGE_DAYS,
+    max_bytes=REDEEM_EVIDENCE_MAX_MB * 1024 * 1024,
+    failures_only=REDEEM_EVIDENCE_FAILURES_ONLY,
+)
+
+# 每個 worker（程序）一個 JSONL 兌換紀錄檔，背景批次寫入；
+# 同一台機器可能同時跑多個 worker，檔名必須與 worker id 相同才不會互相覆寫或輪替
+WORKER_ID = REDEEM_WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+run_log = RunLog(
+    REDEEM_RUN_LOG_DIR,
+    f"run-{WORKER_ID}",
+    max_bytes=REDEEM_RUN_LOG_MAX_MB * 1024 * 1024,
+    backups=REDEEM_RUN_LOG_BACKUPS,
+)
 
-BATCH_ID = os.environ.get("BATCH_ID", "default")
 URL = "https://wos-giftcode.centurygame.com/"
-SCREENSHOT_DIR = os.path.join("screenshots", BATCH_ID)
-LOG_DIR = os.path.join("logs", BATCH_ID)
-os.makedirs(SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(LOG_DIR, exist_ok=True)
-
-if len(sys.argv) < 2:
-    print("[ERROR] Invalid arguments. Usage: redeem.py <code> [<ID>]")
-    sys.exit(1)
-
-REDEEM_CODE = sys.argv[1]
-player_ids = []
-
-if len(sys.argv) == 3:
-    player_ids = [sys.argv[2]]
-else:
-    try:
-        with open("ids.txt", "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#"):
-                    player_ids.append(line)
-    except FileNotFoundError:
-        print("[ERROR] ids.txt not found.")
-        sys.exit(1)
-
-options = Options()
-options.add_argument("--headless")
-options.add_argument("--disable-gpu")
-options.add_argument("--no-sandbox")
-
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=options)
-wait = WebDriverWait(driver, 30)
-
-success = []
-failure = []
-ocr_log_lines = []
+# 點擊兌換後跳出的結果視窗與其中的文字
+RESULT_DIALOG_SELECTOR = ".message_modal"
+RESULT_MESSAGE_SELECTOR = ".message_modal .msg"
+RESULT_CLOSE_SELECTOR = ".message_modal .confirm_btn"
+# 關閉結果視窗最多等幾秒；關不掉就改按 ESC，仍不行就重新載入頁面並登入
+CLOSE_DIALOG_TIMEOUT = 2
 
 FAILURE_KEYWORDS = [
     "兌換碼不存在",
@@ -95,6 +108,9 @@ FAILURE_REASON_MAP = {
     "同類型": "Redeemed",
 }
 
+# ChromeDriver 路徑只需解析一次，之後每個 session 共用
+_driver_path = None
+
 
 def normalize_ocr_text(text):
     return text.replace(" ", "")
@@ -108,26 +124,108 @@ def extract_failure_reason(text):
     return "Unknown Reason"
 
 
-def is_failure_screenshot(img_path):
+def is_failure_text(text):
+    normalized = normalize_ocr_text(text)
+    return any(keyword in normalized for keyword in FAILURE_KEYWORDS)
+
+
+def is_failure_screenshot(img_source):
+    """img_source 可以是檔案路徑或 file-like（例如截圖的 BytesIO）"""
     try:
-        img = Image.open(img_path)
+        img = Image.open(img_source)
         text = pytesseract.image_to_string(img, lang="chi_tra+eng")
-        normalized = normalize_ocr_text(text)
-        failed = any(keyword in normalized for keyword in FAILURE_KEYWORDS)
-        return text, failed
+        return text, is_failure_text(text)
     except Exception:
         return "OCR failed", True
 
 
-for player_id in player_ids:
-    player_ocr_log = []
+def read_result_text(driver):
+    """讀取兌換結果訊息：優先用 DOM 文字，沒有文字時只 OCR 訊息區塊，回傳 (text, source)"""
+    elements = driver.find_elements(By.CSS_SELECTOR, RESULT_MESSAGE_SELECTOR)
+    if not elements:
+        return None, None
+
+    element = elements[0]
+    text = element.text.strip()
+    if text:
+        return text, "dom"
+
     try:
+        img = Image.open(io.BytesIO(element.screenshot_as_png))
+        return pytesseract.image_to_string(img, lang="chi_tra+eng"), "crop_ocr"
+    except Exception:
+        return None, None
+
+
+def result_message_shown(driver):
+    # 只要結果對話框顯示就返回；沒有文字的訊息（圖片）交給 read_result_text 的 OCR
+    for selector in (RESULT_MESSAGE_SELECTOR, RESULT_DIALOG_SELECTOR):
+        elements = driver.find_elements(By.CSS_SELECTOR, selector)
+        if elements and elements[0].is_displayed():
+            return elements[0]
+    return False
+
+
+def wait_for_result(driver):
+    """等結果訊息出現就立即返回（最多 REDEEM_RESULT_TIMEOUT 秒），回傳 (網站實際花費的秒數, 是否逾時)
+
+    逾時通常代表結果視窗的 selector 已不符合網站，之後由整頁截圖 OCR 判斷結果，
+    並記錄 redeem_result_timeout_total 讓監控看得到。
+    """
+    start = time.monotonic()
+    timed_out = False
+    try:
+        WebDriverWait(driver, REDEEM_RESULT_TIMEOUT, poll_frequency=0.1).until(
+            result_message_shown
+        )
+    except TimeoutException:
+        timed_out = True
+        redeem_metrics.inc("redeem_result_timeout_total")
+        print(f"⚠️ Result message not shown within {REDEEM_RESULT_TIMEOUT}s")
+    return round(time.monotonic() - start, 3), timed_out
+
+
+def create_driver():
+    global _driver_path
+    if _driver_path is None:
+        _driver_path = ChromeDriverManager().install()
+
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+
+    service = Service(_driver_path)
+    return webdriver.Chrome(service=service, options=options)
+
+
+def log_result(code, player_id, batch_id, is_failed, reason):
+    # Firestore logging（同時更新兌換結果索引，之後重送可以略過已領取的玩家）
+    result_data = {
+        "code": code,
+        "player_id": player_id,
+        "batch_id": batch_id,
+        "timestamp": firestore.SERVER_TIMESTAMP,
+        "datetime": datetime.now().isoformat(),
+        "result": "fail" if is_failed else "success",
+        "reason": reason,
+    }
+    with redeem_metrics.timer("log_write"):
+        batch = db.batch()
+        batch.set(db.collection("redeem_logs").document(), result_data)
+        redeem_index.record(db, batch, code, player_id, is_failed, reason)
+        batch.commit()
+
+
+def login_player(driver, wait, player_id):
+    with redeem_metrics.timer("page_load"):
         driver.get(URL)
         id_input = wait.until(
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, ".roleId_con .input_wrap input[placeholder='角色ID']")
             )
         )
+    with redeem_metrics.timer("login"):
         id_input.clear()
         id_input.send_keys(player_id)
         wait.until(
@@ -136,6 +234,58 @@ for player_id in player_ids:
         wait.until(
             EC.presence_of_element_located((By.CSS_SELECTOR, ".roleInfo_con .avatar"))
         )
+
+
+def close_result_dialog(driver):
+    """關閉結果視窗，讓同一個登入狀態可以繼續輸入下一組兌換碼；回傳 False 時呼叫端需重新載入並登入"""
+    short_wait = WebDriverWait(driver, CLOSE_DIALOG_TIMEOUT, poll_frequency=0.1)
+    dialog_closed = EC.invisibility_of_element_located(
+        (By.CSS_SELECTOR, RESULT_DIALOG_SELECTOR)
+    )
+    try:
+        short_wait.until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, RESULT_CLOSE_SELECTOR))
+        ).click()
+        short_wait.until(dialog_closed)
+        return True
+    except TimeoutException:
+        pass
+
+    # selector 對不到視窗時無法確認頁面狀態，直接重新載入
+    if not driver.find_elements(By.CSS_SELECTOR, RESULT_DIALOG_SELECTOR):
+        return False
+    try:
+        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+        short_wait.until(dialog_closed)
+        return True
+    except TimeoutException:
+        return False
+
+
+def capture_result_evidence(driver, code, player_id, batch_id, is_failed, reason):
+    """只截結果視窗區塊，壓縮與寫檔交給背景執行緒，回傳截圖路徑（沒有截圖時為 None）"""
+    try:
+        elements = driver.find_elements(By.CSS_SELECTOR, RESULT_DIALOG_SELECTOR)
+        if elements:
+            return evidence.capture(
+                elements[0].screenshot_as_png,
+                batch_id,
+                player_id,
+                code,
+                "result",
+                is_failed,
+                reason,
+            )
+    except Exception as e:
+        print(f"⚠️ Failed to capture result screenshot: {type(e).__name__}: {e}")
+    return None
+
+
+def submit_code(driver, wait, code, player_id, batch_id):
+    ocr_lines = []
+    submit_start = time.perf_counter()
+
+    with redeem_metrics.timer("submit"):
         code_input = wait.until(
             EC.presence_of_element_located(
                 (
@@ -145,70 +295,183 @@ for player_id in player_ids:
             )
         )
         code_input.clear()
-        code_input.send_keys(REDEEM_CODE)
+        code_input.send_keys(code)
         wait.until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, ".exchange_btn"))
         ).click()
 
-        time.sleep(3)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        temp_path = os.path.join(SCREENSHOT_DIR, f"{player_id}_{timestamp}_temp.png")
-        driver.save_screenshot(temp_path)
-
-        ocr_text, is_failed = is_failure_screenshot(temp_path)
-        player_ocr_log.append(f"{os.path.basename(temp_path)} OCR:\n{ocr_text}\n\n")
-        reason = extract_failure_reason(ocr_text) if is_failed else ""
-        suffix = reason.replace(" ", "_") if is_failed else "Success"
-        new_name = f"{player_id}_{timestamp}_{suffix}.png"
-        os.rename(temp_path, os.path.join(SCREENSHOT_DIR, new_name))
-
-        # Firestore logging
-        result_data = {
-            "code": REDEEM_CODE,
-            "player_id": player_id,
-            "batch_id": BATCH_ID,
-            "timestamp": firestore.SERVER_TIMESTAMP,
-            "datetime": datetime.now().isoformat(),
-            "result": "fail" if is_failed else "success",
-            "reason": reason,
-        }
-        db.collection("redeem_logs").add(result_data)
+        result_wait, result_timeout = wait_for_result(driver)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    classify_start = time.perf_counter()
 
-        if is_failed:
-            failure.append((player_id, reason))
+    with redeem_metrics.timer("classify"):
+        result_text, source = (None, None) if result_timeout else read_result_text(driver)
+        if result_text is not None:
+            is_failed = is_failure_text(result_text)
         else:
-            success.append((player_id, "Success"))
+            # 結果視窗逾時或找不到訊息元素時才退回整頁截圖 OCR（只在記憶體中處理，不寫暫存檔）
+            result_text, is_failed = is_failure_screenshot(
+                io.BytesIO(driver.get_screenshot_as_png())
+            )
+            source = "page_ocr"
 
-    except Exception as e:
-        failure.append((player_id, f"Exception: {type(e).__name__}: {e}"))
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        err_img = os.path.join(SCREENSHOT_DIR, f"{player_id}_{timestamp}_error.png")
-        driver.save_screenshot(err_img)
-
-    # Write per-player log
-    player_ocr_path = os.path.join(LOG_DIR, f"ocr_{player_id}_latest.txt")
-    with open(player_ocr_path, "w", encoding="utf-8") as f:
-        f.writelines(player_ocr_log)
-    ocr_log_lines.extend(player_ocr_log)
-
-driver.quit()
-
-# Final print
-result_object = {"success": success, "failure": failure}
-print(json.dumps(result_object, ensure_ascii=False), end="")
-
-# Append summary log
-log_path = os.path.join(LOG_DIR, "log.txt")
-ocr_log_path = os.path.join(LOG_DIR, "ocr_log.txt")
-
-summary_lines = [f"--- Summary ({datetime.now()}) ---\n\n"]
-summary_lines += [f" - {s[0]} -> {s[1]}\n" for s in success]
-summary_lines += [f" - {f[0]} -> Failed, {f[1]}\n" for f in failure]
-
-with open(log_path, "a", encoding="utf-8") as f:
-    f.writelines(summary_lines)
-with open(ocr_log_path, "a", encoding="utf-8") as f:
-    f.writelines(ocr_log_lines)
-
-# Exit with 1 if failure exists
-sys.exit(1 if failure else 0)
+    classify_end = time.perf_counter()
+    ocr_lines.append(f"{player_id}_{timestamp} [{code}] {source}:\n{result_text}\n\n")
+    reason = extract_failure_reason(result_text) if is_failed else ""
+
+    evidence_path = None
+    if REDEEM_SAVE_SCREENSHOTS:
+        evidence_path = capture_result_evidence(
+            driver, code, player_id, batch_id, is_failed, reason
+        )
+
+    log_result(code, player_id, batch_id, is_failed, reason)
+
+    return {
+        "player_id": player_id,
+        "code": code,
+        "result": "fail" if is_failed else "success",
+        "reason": reason if is_failed else "Success",
+        "ocr_lines": ocr_lines,
+        "source": source,
+        "result_wait": result_wait,
+        "result_timeout": result_timeout,
+        "evidence": evidence_path,
+        "timings": {
+            "submit": round(classify_start - submit_start, 3),
+            "classify": round(classify_end - classify_start, 3),
+        },
+    }
+
+
+def redeem_player_codes(driver, codes, player_id, batch_id="default"):
+    """同一個玩家只登入一次，依序兌換多組兌換碼，回傳與 codes 順序相同的結果 list（不會關閉 driver）"""
+    wait = WebDriverWait(driver, 30)
+    outcomes = []
+    logged_in = False
+
+    for code in codes:
+        evidence_path = None
+        try:
+            login_time = None
+            if not logged_in:
+                login_start = time.perf_counter()
+                login_player(driver, wait, player_id)
+                login_time = round(time.perf_counter() - login_start, 3)
+                logged_in = True
+            outcome = submit_code(driver, wait, code, player_id, batch_id)
+            if login_time is not None:
+                outcome["timings"]["login"] = login_time
+            outcomes.append(outcome)
+        except Exception as e:
+            try:
+                # 例外時沒有結果視窗，保留整頁截圖
+                evidence_path = evidence.capture(
+                    driver.get_screenshot_as_png(),
+                    batch_id,
+                    player_id,
+                    code,
+                    "error",
+                    True,
+                    f"Exception: {type(e).__name__}",
+                )
+            except Exception:
+                pass
+            outcomes.append(
+                {
+                    "player_id": player_id,
+                    "code": code,
+                    "result": "fail",
+                    "reason": f"Exception: {type(e).__name__}: {e}",
+                    "ocr_lines": [],
+                    "exception": True,
+                    "evidence": evidence_path,
+                }
+            )
+            # 頁面狀態不明，下一組碼重新載入並登入
+            logged_in = False
+            continue
+
+        try:
+            if not close_result_dialog(driver):
+                print(f"⚠️ Result dialog did not close for {player_id}, reloading")
+                logged_in = False
+        except Exception:
+            logged_in = False
+
+    return outcomes
+
+
+def log_outcomes(batch_id, outcomes, **extra):
+    """每個任務寫一筆 JSONL 紀錄（結果、原因、讀到的文字、截圖路徑與各階段耗時）"""
+    for outcome in outcomes:
+        record = {
+            "type": "task",
+            "batch_id": batch_id,
+            "player_id": outcome["player_id"],
+            "code": outcome["code"],
+            "result": outcome["result"],
+            "reason": outcome["reason"],
+            "source": outcome.get("source"),
+            "text": "".join(outcome["ocr_lines"]).strip(),
+            "evidence": outcome.get("evidence"),
+            "result_wait": outcome.get("result_wait"),
+            "result_timeout": outcome.get("result_timeout", False),
+            "timings": outcome.get("timings", {}),
+        }
+        record.update(extra)
+        run_log.write(record)
+
+
+def main():
+    batch_id = os.environ.get("BATCH_ID", "default")
+
+    if len(sys.argv) < 2:
+        print("[ERROR] Invalid arguments. Usage: redeem.py <code>[,<code>...] [<ID>]")
+        sys.exit(1)
+
+    redeem_codes = [c.strip() for c in sys.argv[1].split(",") if c.strip()]
+    player_ids = []
+
+    if len(sys.argv) == 3:
+        player_ids = [sys.argv[2]]
+    else:
+        try:
+            with open("ids.txt", "r", encoding="utf-8", errors="ignore") as f:
+                player_ids, invalid = parse_id_lines(f.read())
+            for token in invalid:
+                print(f"[WARN] Skipping invalid ID in ids.txt: {token}")
+        except FileNotFoundError:
+            print("[ERROR] ids.txt not found.")
+            sys.exit(1)
+
+    driver = create_driver()
+
+    success = []
+    failure = []
+
+    for player_id in player_ids:
+        outcomes = redeem_player_codes(driver, redeem_codes, player_id, batch_id)
+        for result in outcomes:
+            label = player_id if len(redeem_codes) == 1 else f"{player_id} [{result['code']}]"
+            if result["result"] == "success":
+                success.append((label, "Success"))
+            else:
+                failure.append((label, result["reason"]))
+
+        log_outcomes(batch_id, outcomes, backend="cli")
+
+    driver.quit()
+    evidence.close()
+    run_log.close()
+
+    # Final print
+    result_object = {"success": success, "failure": failure}
+    print(json.dumps(result_object, ensure_ascii=False), end="")
+
+    # Exit with 1 if failure exists
+    sys.exit(1 if failure else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# redeem_index.py
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+from config import REDEEM_INVALID_CODE_TTL_MINUTES
+
+# 兌換碼本身有問題（所有玩家結果都一樣），同一批次其他玩家不必再試
+CODE_LEVEL_REASONS = {"Invalid Code", "Expired"}
+# 在 redeem_codes 的記錄有效多久（None = 永久）：兌換碼可能在上線前就被提交，
+# 「不存在」只暫時擋下；過期的兌換碼不會再變有效
+CODE_BLOCK_TTL = {
+    "Invalid Code": timedelta(minutes=REDEEM_INVALID_CODE_TTL_MINUTES),
+    "Expired": None,
+}
+# 已成功或已領取過，之後不需要再兌換
+DONE_REASONS = {"Success", "Redeemed"}
+
+
+def code_ref(db, code):
+    return db.collection("redeem_codes").document(code.replace("/", "_"))
+
+
+def index_id(code, player_id):
+    return f"{code}_{player_id}".replace("/", "_")
+
+
+def record(db, batch, code, player_id, is_failed, reason):
+    """把兌換結果寫入 (code, player_id) 索引；兌換碼層級的失敗另外記在 redeem_codes"""
+    batch.set(
+        db.collection("redeem_index").document(index_id(code, player_id)),
+        {
+            "code": code,
+            "player_id": player_id,
+            "result": "fail" if is_failed else "success",
+            "reason": reason if is_failed else "Success",
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        },
+    )
+    if is_failed and reason in CODE_LEVEL_REASONS:
+        batch.set(
+            code_ref(db, code),
+            {
+                "code": code,
+                "reason": reason,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+            },
+        )
+
+
+def lookup_done(db, pairs):
+    """回傳 pairs [(code, player_id), ...] 中已成功或已領取過的集合"""
+    refs = [
+        db.collection("redeem_index").document(index_id(code, pid))
+        for code, pid in pairs
+    ]
+    done = set()
+    for snapshot in db.get_all(refs):
+        if not snapshot.exists:
+            continue
+        data = snapshot.to_dict()
+        if data.get("reason") in DONE_REASONS:
+            done.add((data.get("code"), data.get("player_id")))
+    return done
+
+
+def lookup_dead_codes(db, codes):
+    """回傳已確認無效或過期的兌換碼 {code: reason}（超過 CODE_BLOCK_TTL 的記錄不算）"""
+    refs = [code_ref(db, c) for c in codes]
+    now = datetime.now(timezone.utc)
+    dead = {}
+    for snapshot in db.get_all(refs):
+        if not snapshot.exists:
+            continue
+        data = snapshot.to_dict()
+        ttl = CODE_BLOCK_TTL.get(data.get("reason"))
+        updated_at = data.get("updated_at")
+        if ttl is not None and updated_at and now - updated_at > ttl:
+            continue
+        dead[data.get("code")] = data.get("reason")
+    return dead
+
+
+def clear_dead_codes(db, codes):
+    """手動解除兌換碼的封鎖（/redeem_submit force）"""
+    batch = db.batch()
+    for c in codes:
+        batch.delete(code_ref(db, c))
+    batch.commit()
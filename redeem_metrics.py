@@ -0,0 +1,159 @@
+# redeem_metrics.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 延遲分桶（秒），涵蓋 Firestore 寫入到整個瀏覽器流程
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+RECENT_BATCHES = 20
+
+# 兌換流程在 event loop 與 Selenium 執行緒都會記錄，統一用鎖保護
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_batches = deque(maxlen=RECENT_BATCHES)
+_started_at = time.time()
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+    def quantile(self, q):
+        """依分桶估計分位數（回傳所在桶的上界）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        for bound, cumulative in zip(BUCKETS, self.buckets):
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+def observe(stage, seconds):
+    with _lock:
+        _histograms.setdefault(stage, Histogram()).observe(seconds)
+
+
+@contextmanager
+def timer(stage):
+    """記錄區塊執行時間；發生例外也會記錄"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reason_label(reason):
+    # 例外訊息每次都不同，只保留例外類型，避免標籤數量無限增加
+    if reason.startswith("Exception:"):
+        return ":".join(reason.split(":")[:2])
+    return reason
+
+
+def record_outcomes(outcomes):
+    for outcome in outcomes:
+        inc(
+            "redeem_results_total",
+            result=outcome["result"],
+            reason=reason_label(outcome["reason"]),
+        )
+
+
+def record_batch(batch_id, tasks, failures, skipped, seconds):
+    inc("redeem_batches_total")
+    with _lock:
+        _batches.append(
+            {
+                "batch_id": batch_id,
+                "tasks": tasks,
+                "failures": failures,
+                "skipped": skipped,
+                "seconds": round(seconds, 2),
+                "finished_at": time.time(),
+            }
+        )
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def render_prometheus():
+    """輸出 Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        lines.append("# TYPE redeem_stage_seconds histogram")
+        for stage, hist in sorted(_histograms.items()):
+            for bound, cumulative in zip(BUCKETS, hist.buckets):
+                lines.append(
+                    f'redeem_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'redeem_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}'
+            )
+            lines.append(f'redeem_stage_seconds_sum{{stage="{stage}"}} {hist.total:.6f}')
+            lines.append(f'redeem_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+
+        seen = set()
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        lines.append("# TYPE redeem_uptime_seconds gauge")
+        lines.append(f"redeem_uptime_seconds {time.time() - _started_at:.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """給 Firestore / Discord 用的精簡摘要"""
+    with _lock:
+        stages = {
+            stage: {
+                "count": hist.count,
+                "avg": round(hist.total / hist.count, 3) if hist.count else 0.0,
+                "p50": hist.quantile(0.5),
+                "p95": hist.quantile(0.95),
+                "max": round(hist.max, 3),
+            }
+            for stage, hist in _histograms.items()
+        }
+        results = {}
+        for (name, labels), value in _counters.items():
+            if name != "redeem_results_total":
+                continue
+            labels = dict(labels)
+            results.setdefault(labels["result"], {})[labels["reason"]] = value
+        return {
+            "stages": stages,
+            "results": results,
+            "batches": list(_batches),
+            "uptime": round(time.time() - _started_at),
+        }
@@ -3,10 +3,11 @@ import os
 import json
 import discord
 import asyncio
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
 from discord.ext import tasks
 from dotenv import load_dotenv
-import subprocess
 
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -14,6 +15,29 @@ from google.cloud.firestore_v1 import FieldFilter
 
 load_dotenv()
 
+# 以下模組在 import 時讀取環境變數，必須在 load_dotenv() 之後匯入
+import redeem
+import redeem_index
+import redeem_metrics
+from batch_progress import BatchProgress
+from browser_pool import BrowserPool
+from http_redeem import HttpRedeemClient
+from config import (
+    REDEEM_POOL_SIZE,
+    REDEEM_SESSION_MAX_USES,
+    REDEEM_TIMEOUT,
+    REDEEM_MAX_CONCURRENCY,
+    REDEEM_BATCH_CONCURRENCY,
+    REDEEM_BACKEND,
+    REDEEM_API_URL,
+    REDEEM_API_SECRET,
+    REDEEM_INTAKE_DEBOUNCE,
+    REDEEM_LEASE_SECONDS,
+    REDEEM_METRICS_PORT,
+    REDEEM_STATS_INTERVAL,
+    REDEEM_PROGRESS_INTERVAL,
+)
+
 cred_json = json.loads(os.environ.get("FIREBASE_CREDENTIALS", "{}"))
 if "private_key" in cred_json:
     cred_json["private_key"] = cred_json["private_key"].replace("\\n", "\n")
@@ -24,126 +48,638 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
+# 與 redeem.run_log 的檔名使用同一個 id
+WORKER_ID = redeem.WORKER_ID
+CLAIM_CHUNK_SIZE = 100
+# 領取失敗（transaction 競爭、網路錯誤）後重新排入佇列的等待秒數
+CLAIM_RETRY_SECONDS = 5
+
+pool = BrowserPool(size=REDEEM_POOL_SIZE, max_uses=REDEEM_SESSION_MAX_USES)
+if REDEEM_BACKEND == "http" and not REDEEM_API_SECRET:
+    raise RuntimeError("REDEEM_BACKEND=http requires REDEEM_API_SECRET.")
+http_client = (
+    HttpRedeemClient(
+        REDEEM_API_URL,
+        REDEEM_API_SECRET,
+        max_connections=REDEEM_MAX_CONCURRENCY,
+        log_result=redeem.log_result,
+    )
+    if REDEEM_BACKEND == "http"
+    else None
+)
+redeem_slots = asyncio.Semaphore(REDEEM_MAX_CONCURRENCY)
+task_queue = asyncio.Queue()
+task_listener = None
+dispatcher = None
+lease_keeper = None
+inflight_task_ids = set()
+enqueued_at = {}
+metrics_runner = None
+leased_task_ids = set()
+running_batches = set()
+
 intents = discord.Intents.default()
 bot = discord.Client(intents=intents)
 
 
 @bot.event
 async def on_ready():
-    print(f"✅ Redeem Worker Online as {bot.user}")
+    global dispatcher, lease_keeper
+    print(
+        f"✅ Redeem Worker Online as {bot.user} "
+        f"(backend: {REDEEM_BACKEND}, worker: {WORKER_ID})"
+    )
     if not check_tasks.is_running():
+        if http_client is None:
+            await pool.warm_up()
+        start_task_listener()
+        dispatcher = asyncio.create_task(dispatch_tasks())
+        lease_keeper = asyncio.create_task(renew_leases())
         check_tasks.start()
+        publish_stats.start()
+        await start_metrics_server()
 
 
-@tasks.loop(seconds=15)
-async def check_tasks():
-    print("🔍 Checking redeem tasks...")
-    tasks_ref = db.collection("redeem_tasks").where(
-        filter=FieldFilter("status", "==", "pending")
+def enqueue_task(doc_id, task):
+    # 監聽與輪詢可能送來同一筆任務，已排隊或執行中的不要重複加入
+    if doc_id in inflight_task_ids:
+        return
+    inflight_task_ids.add(doc_id)
+    enqueued_at.setdefault(doc_id, time.monotonic())
+    task_queue.put_nowait((doc_id, task))
+
+
+def start_task_listener():
+    global task_listener
+    loop = asyncio.get_running_loop()
+
+    def on_snapshot(doc_snapshots, changes, read_time):
+        # Firestore 在背景執行緒呼叫，轉回 event loop 處理
+        for change in changes:
+            if change.type.name == "ADDED":
+                loop.call_soon_threadsafe(
+                    enqueue_task, change.document.id, change.document.to_dict()
+                )
+
+    task_listener = (
+        db.collection("redeem_tasks")
+        .where(filter=FieldFilter("status", "==", "pending"))
+        .on_snapshot(on_snapshot)
     )
-    docs = list(tasks_ref.stream())
+    print("👂 Listening for pending redeem tasks")
 
-    batches = {}
-    for doc in docs:
-        task = doc.to_dict()
-        batch_id = task.get("batch_id", "default")
-        batches.setdefault(batch_id, []).append((doc.id, task))
 
-    for batch_id, task_list in batches.items():
-        await process_batch(batch_id, task_list)
+def listener_active():
+    return task_listener is not None and task_listener.is_active
 
 
-async def process_batch(batch_id, task_list):
-    channel_id = None
-    all_success = []
-    all_failure = []
-    code = task_list[0][1]["code"] if task_list else "unknown"
+async def dispatch_tasks():
+    """從佇列取出任務，稍等一下收齊同一次提交的其他任務後依 batch 分組執行"""
+    while True:
+        first = await task_queue.get()
+        await asyncio.sleep(REDEEM_INTAKE_DEBOUNCE)
+        pending = [first]
+        while not task_queue.empty():
+            pending.append(task_queue.get_nowait())
 
-    for doc_id, task in task_list:
-        code = task.get("code")
-        player_id = task.get("player_id")
-        channel_id = task.get("channel_id")
+        batches = {}
+        for doc_id, task in pending:
+            batch_id = task.get("batch_id", "default")
+            batches.setdefault(batch_id, []).append((doc_id, task))
 
-        print(f"🎁 Redeeming code: {code} for {player_id}...")
+        for batch_id, task_list in batches.items():
+            try:
+                claimed = await asyncio.to_thread(claim_tasks, task_list)
+            except Exception as e:
+                # 任務仍是 pending，listener 不會再送一次：稍後重新排入佇列再領取
+                print(
+                    f"❌ Failed to claim batch {batch_id}: {type(e).__name__}: {e}, "
+                    f"retrying in {CLAIM_RETRY_SECONDS}s"
+                )
+                asyncio.get_running_loop().call_later(
+                    CLAIM_RETRY_SECONDS, requeue_tasks, task_list
+                )
+                continue
+            claimed_ids = {doc_id for doc_id, _ in claimed}
+            for doc_id, _ in task_list:
+                if doc_id not in claimed_ids:
+                    inflight_task_ids.discard(doc_id)
+            if not claimed:
+                continue
 
-        try:
-            result_json = await run_redeem(code, player_id, batch_id)
-            result = json.loads(result_json)
+            job = asyncio.create_task(process_batch(batch_id, claimed))
+            running_batches.add(job)
+            job.add_done_callback(running_batches.discard)
 
-            for s in result.get("success", []):
-                all_success.append(s[0])
-            for f in result.get("failure", []):
-                all_failure.append((f[0], f[1]))
 
-            db.collection("redeem_tasks").document(doc_id).update(
-                {
-                    "status": "done",
-                    "result": json.dumps(result, ensure_ascii=False),
-                    "completed_at": firestore.SERVER_TIMESTAMP,
-                }
-            )
-        except Exception as e:
-            all_failure.append((player_id, f"{type(e).__name__}: {e}"))
-            db.collection("redeem_tasks").document(doc_id).update(
+def requeue_tasks(task_list):
+    for doc_id, task in task_list:
+        task_queue.put_nowait((doc_id, task))
+
+
+@firestore.transactional
+def claim_in_transaction(transaction, refs):
+    """pending（或租約已過期、或本來就是自己的 claimed）→ claimed，回傳成功領取的 doc id"""
+    snapshots = [ref.get(transaction=transaction) for ref in refs]
+    now = datetime.now(timezone.utc)
+    lease_expires_at = now + timedelta(seconds=REDEEM_LEASE_SECONDS)
+
+    claimed = []
+    for snapshot in snapshots:
+        if not snapshot.exists:
+            continue
+        data = snapshot.to_dict()
+        status = data.get("status")
+        lease = data.get("lease_expires_at")
+        expired = status == "claimed" and lease and lease < now
+        # 先前領取到一半失敗而重試時，自己已領取的任務也要拿回來
+        mine = status == "claimed" and data.get("worker_id") == WORKER_ID
+        if status == "pending" or expired or mine:
+            transaction.update(
+                snapshot.reference,
                 {
-                    "status": "done",
-                    "result": f"{player_id} -> Failed, {type(e).__name__}: {e}",
-                    "completed_at": firestore.SERVER_TIMESTAMP,
-                }
+                    "status": "claimed",
+                    "worker_id": WORKER_ID,
+                    "lease_expires_at": lease_expires_at,
+                    "claimed_at": firestore.SERVER_TIMESTAMP,
+                },
             )
+            claimed.append(snapshot.id)
+    return claimed
+
+
+def claim_tasks(task_list):
+    # 每個 transaction 最多處理 CLAIM_CHUNK_SIZE 筆，避免超過 Firestore 的寫入上限
+    claimed_ids = set()
+    for i in range(0, len(task_list), CLAIM_CHUNK_SIZE):
+        refs = [
+            db.collection("redeem_tasks").document(doc_id)
+            for doc_id, _ in task_list[i : i + CLAIM_CHUNK_SIZE]
+        ]
+        claimed_ids.update(claim_in_transaction(db.transaction(), refs))
 
-    # ✅ 回傳統一的結果到 Discord
-    if channel_id:
+    claimed = [(doc_id, task) for doc_id, task in task_list if doc_id in claimed_ids]
+    leased_task_ids.update(claimed_ids)
+    if len(claimed) < len(task_list):
+        print(f"⏭️ {len(task_list) - len(claimed)} task(s) already claimed elsewhere")
+    return claimed
+
+
+async def renew_leases():
+    """處理中的任務定期延長租約，避免被其他 worker 當成過期任務重新領取"""
+    while True:
+        await asyncio.sleep(REDEEM_LEASE_SECONDS / 3)
+        doc_ids = list(leased_task_ids)
+        if not doc_ids:
+            continue
         try:
-            channel = bot.get_channel(channel_id)
-            if channel:
-                summary_lines = []
-                summary_lines.append(f"📦 Result of redeem `{code}`:")
-                summary_lines.append("--- Summary ---")
-                summary_lines.append(f"Success: {len(all_success)} player(s)")
-                for pid in all_success:
-                    summary_lines.append(f" - {pid} -> Success")
-                summary_lines.append(f"Failed: {len(all_failure)} player(s)")
-                for pid, reason in all_failure:
-                    summary_lines.append(f" - {pid} -> Failed, {reason}")
-                final_text = "\n".join(summary_lines)
-                await channel.send(f"```\n{final_text[:1800]}\n```")
+            await asyncio.to_thread(extend_leases, doc_ids)
         except Exception as e:
-            print(f"❌ Failed to send result message: {e}")
+            print(f"❌ Lease renewal failed: {type(e).__name__}: {e}")
+
+
+def owns_task(snapshot):
+    data = snapshot.to_dict() if snapshot.exists else {}
+    return data.get("status") == "claimed" and data.get("worker_id") == WORKER_ID
+
+
+@firestore.transactional
+def extend_in_transaction(transaction, refs, lease_expires_at):
+    """只延長仍屬於這個 worker 的租約，回傳已被其他 worker 接手的 doc id"""
+    snapshots = [ref.get(transaction=transaction) for ref in refs]
+    lost = []
+    for snapshot in snapshots:
+        if owns_task(snapshot):
+            transaction.update(
+                snapshot.reference, {"lease_expires_at": lease_expires_at}
+            )
+        else:
+            lost.append(snapshot.id)
+    return lost
+
+
+def extend_leases(doc_ids):
+    lease_expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=REDEEM_LEASE_SECONDS
+    )
+    for i in range(0, len(doc_ids), CLAIM_CHUNK_SIZE):
+        refs = [
+            db.collection("redeem_tasks").document(doc_id)
+            for doc_id in doc_ids[i : i + CLAIM_CHUNK_SIZE]
+        ]
+        lost = extend_in_transaction(db.transaction(), refs, lease_expires_at)
+        for doc_id in lost:
+            print(f"⚠️ Lease on task {doc_id} was taken over by another worker")
+            leased_task_ids.discard(doc_id)
+
+
+@firestore.transactional
+def complete_in_transaction(transaction, updates):
+    """updates: {doc_id: 結果欄位}；只完成仍屬於這個 worker 的任務，回傳被接手的 doc id"""
+    refs = [db.collection("redeem_tasks").document(doc_id) for doc_id in updates]
+    snapshots = [ref.get(transaction=transaction) for ref in refs]
+    lost = []
+    for snapshot in snapshots:
+        if owns_task(snapshot):
+            transaction.update(snapshot.reference, updates[snapshot.id])
+        else:
+            lost.append(snapshot.id)
+    return lost
+
+
+def complete_tasks(updates):
+    lost = complete_in_transaction(db.transaction(), updates)
+    for doc_id in lost:
+        print(f"⚠️ Task {doc_id} is owned by another worker now, result not saved")
+
+
+async def stream_docs(query):
+    # Firestore 同步 API 在執行緒執行，不阻塞其他批次與 Discord heartbeat
+    return await asyncio.to_thread(lambda: list(query.stream()))
+
+
+@tasks.loop(seconds=15)
+async def check_tasks():
+    # 其他 worker 中斷後留下的過期租約，重新排入佇列（領取時會再檢查一次）
+    expired = db.collection("redeem_tasks").where(
+        filter=FieldFilter("lease_expires_at", "<", datetime.now(timezone.utc))
+    )
+    for doc in await stream_docs(expired):
+        task = doc.to_dict()
+        if task.get("status") == "claimed":
+            print(f"♻️ Reclaiming expired task {doc.id} (worker: {task.get('worker_id')})")
+            enqueue_task(doc.id, task)
+
+    # 監聽正常時不需要輪詢；監聽中斷時改用輪詢並嘗試重新建立監聽
+    if listener_active():
+        return
+
+    print("🔍 Listener inactive, polling redeem tasks...")
+    tasks_ref = db.collection("redeem_tasks").where(
+        filter=FieldFilter("status", "==", "pending")
+    )
+    for doc in await stream_docs(tasks_ref):
+        enqueue_task(doc.id, doc.to_dict())
+
+    try:
+        if task_listener is not None:
+            task_listener.unsubscribe()
+    except Exception:
+        pass
+    try:
+        start_task_listener()
+    except Exception as e:
+        print(f"❌ Failed to restart task listener: {type(e).__name__}: {e}")
+
 
+async def start_metrics_server():
+    """本機 Prometheus text 格式的 /metrics 端點（REDEEM_METRICS_PORT=0 時不啟動）"""
+    global metrics_runner
+    if not REDEEM_METRICS_PORT or metrics_runner is not None:
+        return
 
-async def run_redeem(code: str, player_id: str, batch_id: str = "default") -> str:
+    async def handle_metrics(request):
+        return web.Response(
+            text=redeem_metrics.render_prometheus(), content_type="text/plain"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, "127.0.0.1", REDEEM_METRICS_PORT).start()
+    except OSError as e:
+        # 同一台機器的其他 worker 已佔用這個 port；兌換照常進行，只是這個 worker 不提供 /metrics
+        await runner.cleanup()
+        print(
+            f"⚠️ Metrics disabled: port {REDEEM_METRICS_PORT} unavailable "
+            f"({type(e).__name__}: {e}); set REDEEM_METRICS_PORT per worker"
+        )
+        return
+    metrics_runner = runner
+    print(f"📈 Metrics on http://127.0.0.1:{REDEEM_METRICS_PORT}/metrics")
+
+
+@tasks.loop(seconds=REDEEM_STATS_INTERVAL)
+async def publish_stats():
+    # 定期把統計摘要寫到 Firestore，給 bot 的 /redeem_stats 讀取
+    data = redeem_metrics.summary()
+    data.update(
+        {
+            "worker_id": WORKER_ID,
+            "backend": REDEEM_BACKEND,
+            "inflight": len(inflight_task_ids),
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        }
+    )
     try:
+        await asyncio.to_thread(
+            db.collection("worker_stats").document(WORKER_ID).set, data
+        )
+    except Exception as e:
+        print(f"⚠️ Failed to publish worker stats: {type(e).__name__}: {e}")
+
+
+def fail_outcomes(codes, player_id, reason):
+    return [
+        {
+            "player_id": player_id,
+            "code": code,
+            "result": "fail",
+            "reason": reason,
+            "ocr_lines": [],
+        }
+        for code in codes
+    ]
+
+
+def skipped_outcome(code, player_id):
+    return {
+        "player_id": player_id,
+        "code": code,
+        "result": "skipped",
+        "reason": "Already redeemed",
+        "ocr_lines": [],
+    }
+
+
+def task_result(player_id, outcome):
+    if outcome["result"] == "success":
+        return {"success": [(player_id, "Success")], "failure": []}
+    if outcome["result"] == "skipped":
+        return {"success": [], "failure": [], "skipped": [(player_id, outcome["reason"])]}
+    return {"success": [], "failure": [(player_id, outcome["reason"])]}
+
+
+def fill_dead_codes(outcomes, codes, player_id, dead_codes):
+    """已確認無效/過期的兌換碼直接套用同一個失敗原因"""
+    for code in codes:
+        if code not in outcomes and code in dead_codes:
+            outcomes[code] = fail_outcomes([code], player_id, dead_codes[code])[0]
+
 
-        def call_redeem():
-            env = os.environ.copy()
-            if batch_id:
-                env["BATCH_ID"] = batch_id
-            return subprocess.run(
-                ["python", "redeem.py", code, player_id],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                encoding="utf-8",
-                timeout=90,
-                env=env,  # ✅ 傳入環境變數
-            ).stdout.strip()
-
-        result = await asyncio.to_thread(call_redeem)
+def find_probe_player(players, done_pairs, dead_codes):
+    """找出第一個還有兌換碼需要實際兌換的玩家，用來先試兌換碼是否有效"""
+    for player_id, player_tasks in players.items():
+        for _, task in player_tasks:
+            code = task.get("code")
+            if (code, player_id) not in done_pairs and code not in dead_codes:
+                return player_id
+    return None
+
+
+async def redeem_player_tasks(
+    batch_id, player_id, player_tasks, batch_slots, done_pairs, dead_codes
+):
+    """同一個玩家的所有任務（多組兌換碼）共用一次登入，回傳與 player_tasks 順序相同的結果
+    已領取過的略過；已確認無效/過期的兌換碼直接沿用同一個失敗原因，不開瀏覽器"""
+    # 從領取到完成都在同一個 try 裡：中途發生任何例外都要放掉租約，
+    # 否則租約會一直被續約，其他 worker 永遠無法重新領取
+    try:
+        codes = [task.get("code") for _, task in player_tasks]
+        outcomes = {}
+        for code in codes:
+            if (code, player_id) in done_pairs:
+                outcomes[code] = skipped_outcome(code, player_id)
+        fill_dead_codes(outcomes, codes, player_id, dead_codes)
+
+        queue_wait = None
+        if len(outcomes) < len(codes):
+            # 先排批次內的名額，再搶全域名額：大批次同時最多只佔 REDEEM_BATCH_CONCURRENCY 個位置
+            async with batch_slots, redeem_slots:
+                now = time.monotonic()
+                for doc_id, _ in player_tasks:
+                    if doc_id in enqueued_at:
+                        queue_wait = now - enqueued_at.pop(doc_id)
+                        redeem_metrics.observe("queue_wait", queue_wait)
+                # 等待名額期間其他玩家可能已確認兌換碼無效
+                fill_dead_codes(outcomes, codes, player_id, dead_codes)
+                to_run = [code for code in codes if code not in outcomes]
+                if to_run:
+                    print(
+                        f"🎁 Redeeming code(s): {', '.join(to_run)} for {player_id}..."
+                    )
+                    try:
+                        results = await run_redeem(to_run, player_id, batch_id)
+                    except Exception as e:
+                        results = fail_outcomes(
+                            to_run, player_id, f"{type(e).__name__}: {e}"
+                        )
+                    for code, outcome in zip(to_run, results):
+                        outcomes[code] = outcome
+                        if outcome["reason"] in redeem_index.CODE_LEVEL_REASONS:
+                            dead_codes.setdefault(code, outcome["reason"])
+
+        outcomes = [outcomes[code] for code in codes]
+        redeem_metrics.record_outcomes(outcomes)
+        redeem.log_outcomes(
+            batch_id,
+            outcomes,
+            worker_id=WORKER_ID,
+            backend=REDEEM_BACKEND,
+            queue_wait=round(queue_wait, 3) if queue_wait is not None else None,
+        )
+
+        updates = {
+            doc_id: {
+                "status": "done",
+                "result": json.dumps(
+                    task_result(player_id, outcome), ensure_ascii=False
+                ),
+                "completed_at": firestore.SERVER_TIMESTAMP,
+                "lease_expires_at": firestore.DELETE_FIELD,
+            }
+            for (doc_id, _), outcome in zip(player_tasks, outcomes)
+        }
         try:
-            json.loads(result)  # 檢查格式
+            # 一位玩家的所有任務一次 transaction 寫入，在執行緒執行避免卡住 event loop
+            with redeem_metrics.timer("task_commit"):
+                await asyncio.to_thread(complete_tasks, updates)
         except Exception as e:
-            print("🚫 非預期的輸出：", result)  # 加這行 debug
-            raise
-        return result
+            print(
+                f"❌ Failed to update tasks for {player_id}: {type(e).__name__}: {e}"
+            )
+        return outcomes
+    finally:
+        for doc_id, _ in player_tasks:
+            leased_task_ids.discard(doc_id)
+            inflight_task_ids.discard(doc_id)
+            enqueued_at.pop(doc_id, None)
+
+
+async def start_progress(batch_id, task_list):
+    """在提交兌換的頻道發出進度訊息；找不到頻道時回傳 None"""
+    channel_id = task_list[0][1].get("channel_id")
+    channel = bot.get_channel(channel_id) if channel_id else None
+    if channel is None:
+        return None
+    codes = list(dict.fromkeys(task.get("code") for _, task in task_list))
+    progress = BatchProgress(
+        channel, batch_id, codes, len(task_list), interval=REDEEM_PROGRESS_INTERVAL
+    )
+    await progress.start()
+    return progress
+
+
+def format_results(results_by_code):
+    lines = []
+    for code, code_result in results_by_code.items():
+        lines.append(f"📦 Result of redeem `{code}`:")
+        lines.append("--- Summary ---")
+        lines.append(f"Success: {len(code_result['success'])} player(s)")
+        for pid in code_result["success"]:
+            lines.append(f" - {pid} -> Success")
+        lines.append(f"Failed: {len(code_result['failure'])} player(s)")
+        for pid, reason in code_result["failure"]:
+            lines.append(f" - {pid} -> Failed, {reason}")
+        lines.append(f"Skipped (already redeemed): {len(code_result['skipped'])} player(s)")
+        for pid in code_result["skipped"]:
+            lines.append(f" - {pid} -> Skipped")
+        lines.append("")
+    return "\n".join(lines)
+
+
+async def process_batch(batch_id, task_list):
+    batch_start = time.perf_counter()
+    progress = await start_progress(batch_id, task_list)
+
+    # 依玩家分組（保留第一次出現的順序），同一玩家的多組兌換碼一起處理
+    players = {}
+    for doc_id, task in task_list:
+        players.setdefault(task.get("player_id"), []).append((doc_id, task))
 
-    except subprocess.TimeoutExpired:
-        return f"{player_id} -> Failed, Timeout"
+    # 執行前先查兌換結果索引
+    codes = list(dict.fromkeys(task.get("code") for _, task in task_list))
+    pairs = [(task.get("code"), task.get("player_id")) for _, task in task_list]
+    try:
+        done_pairs = await asyncio.to_thread(redeem_index.lookup_done, db, pairs)
+        dead_codes = await asyncio.to_thread(redeem_index.lookup_dead_codes, db, codes)
     except Exception as e:
-        return f"{player_id} -> Failed, {type(e).__name__}: {e}"
+        print(f"⚠️ Redeem index lookup failed: {type(e).__name__}: {e}")
+        done_pairs, dead_codes = set(), {}
 
+    batch_slots = asyncio.Semaphore(REDEEM_BATCH_CONCURRENCY)
+    outcomes_by_player = {}
 
-if __name__ == "__main__":
+    async def run_player(player_id):
+        outcomes = await redeem_player_tasks(
+            batch_id, player_id, players[player_id], batch_slots, done_pairs, dead_codes
+        )
+        # 每位玩家完成就更新進度訊息
+        if progress is not None:
+            progress.add(outcomes)
+        return outcomes
+
+    # 先用第一位玩家試兌換碼：若是兌換碼本身無效/過期，其餘玩家直接套用同一個原因
+    probe_player = find_probe_player(players, done_pairs, dead_codes)
+    if probe_player is not None and len(players) > 1:
+        outcomes_by_player[probe_player] = await run_player(probe_player)
+        if dead_codes:
+            print(f"⛔ Batch {batch_id}: code(s) {', '.join(dead_codes)} failed fast")
+
+    rest = [pid for pid in players if pid not in outcomes_by_player]
+    rest_outcomes = await asyncio.gather(*(run_player(pid) for pid in rest))
+    outcomes_by_player.update(zip(rest, rest_outcomes))
+
+    outcome_by_doc = {}
+    for player_id, player_tasks in players.items():
+        for (doc_id, _), outcome in zip(player_tasks, outcomes_by_player[player_id]):
+            outcome_by_doc[doc_id] = outcome
+
+    # 摘要依照兌換碼與玩家的提交順序排列
+    results_by_code = {}
+    for doc_id, task in task_list:
+        outcome = outcome_by_doc[doc_id]
+        code_result = results_by_code.setdefault(
+            task.get("code"), {"success": [], "failure": [], "skipped": []}
+        )
+        if outcome["result"] == "success":
+            code_result["success"].append(outcome["player_id"])
+        elif outcome["result"] == "skipped":
+            code_result["skipped"].append(outcome["player_id"])
+        else:
+            code_result["failure"].append((outcome["player_id"], outcome["reason"]))
+
+    batch_seconds = time.perf_counter() - batch_start
+    failures = sum(len(r["failure"]) for r in results_by_code.values())
+    skipped = sum(len(r["skipped"]) for r in results_by_code.values())
+    redeem.run_log.write(
+        {
+            "type": "batch",
+            "batch_id": batch_id,
+            "worker_id": WORKER_ID,
+            "codes": list(results_by_code),
+            "tasks": len(task_list),
+            "failures": failures,
+            "skipped": skipped,
+            "seconds": round(batch_seconds, 3),
+        }
+    )
+    redeem_metrics.record_batch(
+        batch_id, len(task_list), failures, skipped, batch_seconds
+    )
+
+    # ✅ 最後一次更新進度訊息，完整結果以附件送出
+    if progress is not None:
+        await progress.finish(format_results(results_by_code))
+
+
+async def run_redeem(codes: list, player_id: str, batch_id: str = "default") -> list:
+    timeout = REDEEM_TIMEOUT * len(codes)
+
+    if http_client is not None:
+        try:
+            return await asyncio.wait_for(
+                http_client.redeem_codes(codes, player_id, batch_id), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            return fail_outcomes(codes, player_id, "Timeout")
+
+    acquire_start = time.perf_counter()
+    async with pool.session() as session:
+        redeem_metrics.observe("browser_acquire", time.perf_counter() - acquire_start)
+        try:
+            outcomes = await asyncio.wait_for(
+                asyncio.to_thread(
+                    redeem.redeem_player_codes,
+                    session.driver,
+                    codes,
+                    player_id,
+                    batch_id,
+                ),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            # 執行緒仍可能卡在這個 driver 上，直接丟棄 session
+            session.broken = True
+            return fail_outcomes(codes, player_id, "Timeout")
+
+        if any(o.get("exception") for o in outcomes) and not await asyncio.to_thread(
+            session.is_alive
+        ):
+            session.broken = True
+        return outcomes
+
+
+async def main():
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         raise RuntimeError("DISCORD_TOKEN not set.")
-    bot.run(token)
+    async with bot:
+        try:
+            await bot.start(token)
+        finally:
+            if task_listener is not None:
+                task_listener.unsubscribe()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await pool.close()
+            if http_client is not None:
+                await http_client.close()
+            await asyncio.to_thread(redeem.evidence.close)
+            await asyncio.to_thread(redeem.run_log.close)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+# roster.py
+import asyncio
+import re
+
+from firebase_admin import firestore
+
+import async_db
+
+# 等待 listener 初次 snapshot 的秒數，逾時改用一次性查詢
+INITIAL_SNAPSHOT_TIMEOUT = 10
+
+
+def is_valid_player_id(player_id):
+    return player_id.isdigit() and len(player_id) == 9
+
+
+def parse_id_lines(text):
+    """解析玩家 ID 清單（與舊版 ids.txt 相同格式：一行一個、# 開頭為註解；也接受逗號或空白分隔）
+    回傳 (有效 ID 依序去重, 無效項目)"""
+    valid = []
+    invalid = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        for token in re.split(r"[,\s]+", line):
+            if not token:
+                continue
+            if is_valid_player_id(token):
+                valid.append(token)
+            else:
+                invalid.append(token)
+    return list(dict.fromkeys(valid)), invalid
+
+
+class RosterCache:
+    """各 guild 的玩家名單快取（ids/{guild}/players）：第一次使用時載入，之後由 snapshot listener 同步"""
+
+    def __init__(self):
+        self._db = None
+        self.guilds = {}  # guild_id -> {player_id: {doc_id, ...}}
+        self.listeners = {}  # guild_id -> Watch
+        self.ready = {}  # guild_id -> asyncio.Event
+        self.loop = None
+
+    @property
+    def db(self):
+        # 第一次使用時才取得 client：redeem.py 等模組只匯入 parse_id_lines，匯入時 Firebase 可能尚未初始化
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    def players_ref(self, guild_id):
+        return self.db.collection("ids").document(str(guild_id)).collection("players")
+
+    async def _ensure_loaded(self, guild_id):
+        guild_id = str(guild_id)
+        listener = self.listeners.get(guild_id)
+        if listener is not None and not listener.is_active:
+            # listener 已中斷：作廢快取，重新載入
+            self.invalidate(guild_id)
+
+        if guild_id not in self.ready:
+            self.loop = asyncio.get_running_loop()
+            self.ready[guild_id] = asyncio.Event()
+            self.guilds[guild_id] = {}
+            self.listeners[guild_id] = self.players_ref(guild_id).on_snapshot(
+                lambda docs, changes, read_time: self.loop.call_soon_threadsafe(
+                    self._apply,
+                    guild_id,
+                    [
+                        (c.type.name, c.document.id, c.document.to_dict())
+                        for c in changes
+                    ],
+                )
+            )
+
+        ready = self.ready[guild_id]
+        if ready.is_set():
+            return self.guilds[guild_id]
+        try:
+            await asyncio.wait_for(ready.wait(), timeout=INITIAL_SNAPSHOT_TIMEOUT)
+        except asyncio.TimeoutError:
+            docs = await async_db.stream("ids.list", self.players_ref(guild_id))
+            self._apply(guild_id, [("ADDED", d.id, d.to_dict()) for d in docs])
+        return self.guilds[guild_id]
+
+    def _apply(self, guild_id, changes):
+        players = self.guilds.get(guild_id)
+        if players is None:
+            return
+        for change_type, doc_id, data in changes:
+            player_id = (data or {}).get("player_id", doc_id)
+            if change_type == "REMOVED":
+                self._discard(players, player_id, doc_id)
+            else:
+                players.setdefault(player_id, set()).add(doc_id)
+        self.ready[guild_id].set()
+
+    def _discard(self, players, player_id, doc_id):
+        doc_ids = players.get(player_id)
+        if doc_ids is None:
+            return
+        doc_ids.discard(doc_id)
+        if not doc_ids:
+            del players[player_id]
+
+    def invalidate(self, guild_id):
+        guild_id = str(guild_id)
+        listener = self.listeners.pop(guild_id, None)
+        if listener is not None:
+            try:
+                listener.unsubscribe()
+            except Exception:
+                pass
+        self.guilds.pop(guild_id, None)
+        self.ready.pop(guild_id, None)
+
+    async def contains(self, guild_id, player_id):
+        return player_id in await self._ensure_loaded(guild_id)
+
+    async def player_ids(self, guild_id):
+        return sorted(await self._ensure_loaded(guild_id))
+
+    async def doc_ids(self, guild_id, player_id):
+        return set((await self._ensure_loaded(guild_id)).get(player_id, ()))
+
+    def added(self, guild_id, player_id, doc_id=None):
+        # 寫入後立即更新快取，不必等 listener
+        players = self.guilds.get(str(guild_id))
+        if players is not None:
+            players.setdefault(player_id, set()).add(doc_id or player_id)
+
+    def removed(self, guild_id, player_id):
+        players = self.guilds.get(str(guild_id))
+        if players is not None:
+            players.pop(player_id, None)
+
+
+roster = RosterCache()
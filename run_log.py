@@ -0,0 +1,158 @@
+# run_log.py
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 背景寫入：最多累積這麼多秒或這麼多筆才寫一次檔案
+FLUSH_INTERVAL = 1.0
+FLUSH_RECORDS = 200
+
+
+class RunLog:
+    """append-only 的 JSONL 兌換紀錄，一筆任務一行
+
+    寫入在背景執行緒批次進行；檔案超過 max_bytes 時改名並 gzip 壓縮，只保留最新 backups 個壓縮檔。
+    """
+
+    def __init__(self, directory, name, max_bytes=20 * 1024 * 1024, backups=20):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        record.setdefault("ts", datetime.now().astimezone().isoformat())
+        self._ensure_thread()
+        self._queue.put(json.dumps(record, ensure_ascii=False, default=str))
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="run-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        closing = False
+        while not closing:
+            lines = []
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(lines) < FLUSH_RECORDS:
+                timeout = deadline - time.monotonic()
+                try:
+                    line = self._queue.get(timeout=max(timeout, 0) if lines else None)
+                except queue.Empty:
+                    break
+                if line is None:
+                    closing = True
+                    break
+                lines.append(line)
+            if lines:
+                try:
+                    self._append(lines)
+                except Exception as e:
+                    print(f"⚠️ Failed to write run log: {type(e).__name__}: {e}")
+
+    def _append(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            size = f.tell()
+        if size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        rotated = os.path.join(self.directory, f"{self.name}-{stamp}.jsonl")
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+
+        pattern = os.path.join(self.directory, f"{self.name}-*.jsonl.gz")
+        archives = sorted(glob.glob(pattern))
+        for old in archives[: max(0, len(archives) - self.backups)]:
+            os.remove(old)
+
+    def close(self):
+        """等待佇列中的紀錄寫完"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+
+def log_files(directory):
+    """依時間順序列出所有紀錄檔（壓縮檔在前，目前寫入中的檔案在後）"""
+    archives = sorted(glob.glob(os.path.join(directory, "*.jsonl.gz")))
+    current = sorted(glob.glob(os.path.join(directory, "*.jsonl")))
+    return archives + current
+
+
+def iter_records(
+    directory, code=None, player_id=None, reason=None, since=None, until=None
+):
+    """逐行讀取並篩選紀錄，不會一次載入整個檔案；since / until 為 ISO 時間字串（可只給日期）"""
+    for path in log_files(directory):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if code and record.get("code") != code:
+                    continue
+                if player_id and record.get("player_id") != player_id:
+                    continue
+                record_reason = str(record.get("reason", "")).lower()
+                if reason and reason.lower() not in record_reason:
+                    continue
+                ts = record.get("ts", "")
+                if since and ts < since:
+                    continue
+                # 只給日期時 until 包含當天
+                if until and ts[: len(until)] > until:
+                    continue
+                yield record
+
+
+def main():
+    # python run_log.py [--code CODE] [--player ID] [--reason TEXT] [--since ISO] [--until ISO]
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from config import REDEEM_RUN_LOG_DIR
+
+    args = sys.argv[1:]
+    flags = {
+        "--code": "code",
+        "--player": "player_id",
+        "--reason": "reason",
+        "--since": "since",
+        "--until": "until",
+    }
+    filters = {}
+    for flag, key in flags.items():
+        if flag in args and args.index(flag) + 1 < len(args):
+            filters[key] = args[args.index(flag) + 1]
+
+    for record in iter_records(REDEEM_RUN_LOG_DIR, **filters):
+        print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# tasks/audit_log.py
+
+import asyncio
+from datetime import datetime
+
+import discord
+import pytz
+from firebase_admin import firestore
+
+import async_db
+from config import LOG_CHANNEL_ID, LOG_FIRESTORE_ENABLED, AUDIT_FLUSH_SECONDS
+
+TIMEZONE = pytz.timezone("Asia/Taipei")
+# Discord 單則訊息上限 2000 字，保留一些空間
+MESSAGE_LIMIT = 1900
+
+
+class AuditLog:
+    """操作紀錄先排入佇列立即返回，每 AUDIT_FLUSH_SECONDS 秒合併成一則 Discord 訊息與一次 Firestore batch"""
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self.db = firestore.client()
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.channel = None
+        self.runner = None
+
+    def log(self, message, guild_id=None, source="notify.py"):
+        self.pending.append(
+            {
+                "message": message,
+                "datetime": datetime.now()
+                .astimezone(TIMEZONE)
+                .strftime("%Y-%m-%d %H:%M:%S"),
+                "guild_id": str(guild_id) if guild_id else None,
+                "source": source,
+            }
+        )
+        self.wakeup.set()
+
+    async def start(self):
+        self.runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止背景工作並送出剩下的紀錄；不取消進行中的 flush，避免已取出的紀錄遺失"""
+        if self.runner is not None:
+            self.stopping.set()
+            self.wakeup.set()
+            await self.runner
+            self.runner = None
+        await self.flush()
+
+    async def _run(self):
+        while not self.stopping.is_set():
+            await self.wakeup.wait()
+            # 等一下，把這段時間內的紀錄合併送出（停止時不必再等）
+            try:
+                await asyncio.wait_for(self.stopping.wait(), AUDIT_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self.wakeup.clear()
+        events, self.pending = self.pending, []
+        if not events:
+            return
+        await asyncio.gather(self._send_discord(events), self._write_firestore(events))
+
+    async def _resolve_channel(self):
+        if self.channel is None:
+            self.channel = self.bot.get_channel(LOG_CHANNEL_ID)
+        if self.channel is None:
+            self.channel = await self.bot.fetch_channel(LOG_CHANNEL_ID)
+        return self.channel
+
+    async def _send_discord(self, events):
+        chunks = []
+        current = ""
+        for event in events:
+            line = f"📝 [`{event['datetime']}`] {event['message']}"[:MESSAGE_LIMIT]
+            if current and len(current) + len(line) + 1 > MESSAGE_LIMIT:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        chunks.append(current)
+
+        try:
+            channel = await self._resolve_channel()
+            for chunk in chunks:
+                await channel.send(chunk)
+        except Exception as e:
+            # 頻道可能被刪除或權限變更，下次重新取得
+            self.channel = None
+            print(f"❌ Discord log failed: {type(e).__name__}: {e}")
+
+    async def _write_firestore(self, events):
+        if not LOG_FIRESTORE_ENABLED:
+            return
+        collection = self.db.collection("logs")
+        writes = []
+        for event in events:
+            data = {
+                "message": event["message"],
+                "timestamp": firestore.SERVER_TIMESTAMP,
+                "datetime": event["datetime"],
+                "source": event["source"],
+            }
+            if event["guild_id"]:
+                data["guild_id"] = event["guild_id"]
+            writes.append((collection.document(), data))
+        try:
+            await async_db.commit_sets("logs.batch_add", self.db, writes)
+        except Exception as e:
+            print(f"❌ Firestore log failed: {type(e).__name__}: {e}")
@@ -1,56 +1,111 @@
 # tasks/notify_loop.py
 
-from datetime import datetime, timedelta
+import asyncio
+from collections import OrderedDict
 from firebase_admin import firestore
-from google.cloud.firestore_v1 import FieldFilter
-import pytz
 import discord
 
-TIMEZONE = pytz.timezone("Asia/Taipei")
+import async_db
+from config import NOTIFY_MAX_CONCURRENCY, CHANNEL_CACHE_SIZE
+from tasks.recurrence import next_occurrence
 
 
-async def run_notify_once(bot: discord.Client):
-    db = firestore.client()
-    now_utc = datetime.now(pytz.utc)
-    now_taipei = now_utc.astimezone(TIMEZONE)
+# 最近 fetch 過的頻道（gateway cache 找不到時才會用到）
+_channel_cache = OrderedDict()
+_channel_locks = {}
+_dispatch_slots = asyncio.Semaphore(NOTIFY_MAX_CONCURRENCY)
+
+
+async def resolve_channel(bot: discord.Client, channel_id: int):
+    """優先從 gateway cache 取得頻道，取不到才 fetch（結果放進 LRU）"""
+    channel = bot.get_channel(channel_id)
+    if channel is not None:
+        return channel
+
+    channel = _channel_cache.get(channel_id)
+    if channel is not None:
+        _channel_cache.move_to_end(channel_id)
+        return channel
+
+    channel = await bot.fetch_channel(channel_id)
+    _channel_cache[channel_id] = channel
+    if len(_channel_cache) > CHANNEL_CACHE_SIZE:
+        _channel_cache.popitem(last=False)
+    return channel
+
+
+async def send_reminder(bot: discord.Client, doc_id: str, data: dict) -> bool:
+    """發送單筆提醒（同一頻道依序發送，避免撞到頻道的 rate limit）"""
+    print(f"➡️ 發送提醒：{data}")
+    channel_id = data.get("channel_id")
+    mention = data.get("mention", "")
+    message = data.get("message", "")
 
-    lower_bound = now_utc - timedelta(seconds=30)
-    upper_bound = now_utc + timedelta(seconds=15)
+    lock = _channel_locks.setdefault(channel_id, asyncio.Lock())
+    # 先排同頻道的鎖再拿全域名額，同一頻道排隊的提醒不會佔住其他頻道的名額
+    async with lock, _dispatch_slots:
+        try:
+            channel = await resolve_channel(bot, channel_id)
+            if channel:
+                content = (
+                    f"{mention}\n⏰ 活動提醒 ⏰\n{message}"
+                    if mention and mention.strip()
+                    else f"⏰ 活動提醒 ⏰\n{message}"
+                )
+                await channel.send(content)
+                print(f"✅ 發送成功：{doc_id}")
+                return True
+            else:
+                print(f"⚠️ 找不到頻道：{channel_id}")
+        except Exception as e:
+            _channel_cache.pop(channel_id, None)
+            print(f"❌ 發送失敗：{type(e).__name__}: {e}")
+    return False
 
-    print(f"🔁 notify_task run (UTC): {now_utc.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"🕰️ 台北時間：{now_taipei.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"⏱️ 查詢時間範圍(UTC):{lower_bound} ~ {upper_bound}")
 
+async def dispatch_reminders(bot: discord.Client, reminders):
+    """同時發送多筆提醒 [(doc_id, data), ...]，發送成功的交給 advance_reminders 寫回；
+    回傳發送成功的 doc_id"""
+    if not reminders:
+        return []
+
+    results = await asyncio.gather(
+        *(send_reminder(bot, doc_id, data) for doc_id, data in reminders)
+    )
+    sent = [(doc_id, data) for (doc_id, data), ok in zip(reminders, results) if ok]
+    await advance_reminders("notifications.after_send", sent)
+    return [doc_id for doc_id, _ in sent]
+
+
+async def advance_reminders(label, reminders):
+    """一次 batch 寫回 [(doc_id, data), ...]：一次性提醒刪除，
+    重複提醒推進到下一次時間（規則結束時刪除）；寫入失敗時回傳 False"""
+    if not reminders:
+        return True
+
+    db = firestore.client()
+    collection = db.collection("notifications")
+    ops = []
+    for doc_id, data in reminders:
+        next_dt, remaining = next_occurrence(data)
+        if next_dt is None:
+            ops.append(("delete", collection.document(doc_id), None))
+        else:
+            ops.append(
+                (
+                    "update",
+                    collection.document(doc_id),
+                    {
+                        "datetime": next_dt,
+                        "recurrence.remaining": remaining,
+                    },
+                )
+            )
     try:
-        docs = list(
-            db.collection("notifications")
-            .where(filter=FieldFilter("datetime", ">=", lower_bound))
-            .where(filter=FieldFilter("datetime", "<=", upper_bound))
-            .stream()
-        )
-        print(f"📄 找到 {len(docs)} 筆提醒")
-
-        for doc in docs:
-            data = doc.to_dict()
-            print(f"➡️ 發送提醒：{data}")
-            channel_id = data.get("channel_id")
-            mention = data.get("mention", "")
-            message = data.get("message", "")
-
-            try:
-                channel = await bot.fetch_channel(channel_id)
-                if channel:
-                    content = (
-                        f"{mention}\n⏰ 活動提醒 ⏰\n{message}"
-                        if mention and mention.strip()
-                        else f"⏰ 活動提醒 ⏰\n{message}"
-                    )
-                    await channel.send(content)
-                    db.collection("notifications").document(doc.id).delete()
-                    print(f"✅ 發送成功並刪除：{doc.id}")
-                else:
-                    print(f"⚠️ 找不到頻道：{channel_id}")
-            except Exception as e:
-                print(f"❌ 發送失敗：{type(e).__name__}: {e}")
+        await async_db.commit_writes(label, db, ops)
+        print(f"🗑️ 已更新 {len(ops)} 筆提醒")
+        return True
     except Exception as e:
-        print(f"❌ 通知任務錯誤：{type(e).__name__}: {e}")
+        print(f"❌ 更新提醒失敗：{type(e).__name__}: {e}")
+        return False
+
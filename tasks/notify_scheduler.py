@@ -0,0 +1,203 @@
+# tasks/notify_scheduler.py
+
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta
+
+import discord
+import pytz
+from firebase_admin import firestore
+from google.cloud.firestore_v1 import FieldFilter
+
+import async_db
+from config import NOTIFY_CATCHUP_MINUTES
+from tasks.notify_loop import advance_reminders, dispatch_reminders
+from tasks.recurrence import next_occurrence
+from tasks.reminder_cache import reminder_cache
+
+# 最長睡眠秒數：順便檢查監聽是否還活著
+MAX_SLEEP_SECONDS = 60
+# 發送失敗時隔多久重試、最多嘗試幾次
+RETRY_SECONDS = 30
+MAX_SEND_ATTEMPTS = 3
+
+
+class NotifyScheduler:
+    """把即將到來的提醒放進 min-heap，睡到下一筆到期為止；以 snapshot listener 保持同步"""
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self.db = firestore.client()
+        self.reminders = {}  # doc_id -> data
+        self.heap = []  # (fire_ts, doc_id)
+        self.due_at = {}  # doc_id -> 目前有效的 heap 時間（重試時晚於提醒時間）
+        self.attempts = {}  # doc_id -> 已失敗次數
+        self.wakeup = asyncio.Event()
+        self.listener = None
+        self.runner = None
+        self.loop = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        await self._advance_stale_recurring()
+        self._subscribe()
+        self.runner = asyncio.create_task(self._run())
+        print("✅ notify scheduler started")
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.unsubscribe()
+        if self.runner is not None:
+            self.runner.cancel()
+
+    async def _advance_stale_recurring(self):
+        """停機超過補發範圍的重複提醒，直接推進到下一次時間（不補發）"""
+        lower_bound = datetime.now(pytz.utc) - timedelta(minutes=NOTIFY_CATCHUP_MINUTES)
+        collection = self.db.collection("notifications")
+        try:
+            docs = await async_db.stream(
+                "notifications.stale",
+                collection.where(filter=FieldFilter("datetime", "<", lower_bound)),
+            )
+            ops = []
+            for doc in docs:
+                data = doc.to_dict()
+                if not data.get("recurrence"):
+                    continue
+                next_dt, remaining = next_occurrence(data)
+                if next_dt is None:
+                    ops.append(("delete", doc.reference, None))
+                else:
+                    ops.append(
+                        (
+                            "update",
+                            doc.reference,
+                            {"datetime": next_dt, "recurrence.remaining": remaining},
+                        )
+                    )
+            if ops:
+                await async_db.commit_writes("notifications.stale_advance", self.db, ops)
+                print(f"🔁 已推進 {len(ops)} 筆過期的重複提醒")
+        except Exception as e:
+            print(f"❌ 推進過期重複提醒失敗：{type(e).__name__}: {e}")
+
+    def _subscribe(self):
+        # 停機期間錯過的提醒（NOTIFY_CATCHUP_MINUTES 內）會在初次 snapshot 中一併載入並立即補發
+        lower_bound = datetime.now(pytz.utc) - timedelta(minutes=NOTIFY_CATCHUP_MINUTES)
+        self.reminders.clear()
+        self.heap.clear()
+        self.due_at.clear()
+        self.attempts.clear()
+        reminder_cache.clear()
+        self.listener = (
+            self.db.collection("notifications")
+            .where(filter=FieldFilter("datetime", ">=", lower_bound))
+            .on_snapshot(self._on_snapshot)
+        )
+
+    def _on_snapshot(self, doc_snapshots, changes, read_time):
+        # Firestore 在背景執行緒呼叫，轉回 event loop 處理
+        updates = [
+            (change.type.name, change.document.id, change.document.to_dict())
+            for change in changes
+        ]
+        self.loop.call_soon_threadsafe(self._apply, updates)
+
+    def _apply(self, updates):
+        reminder_cache.apply(updates)
+        for change_type, doc_id, data in updates:
+            if change_type == "REMOVED":
+                self._forget(doc_id)
+                continue
+            self.attempts.pop(doc_id, None)
+            self._schedule(doc_id, data, data["datetime"].timestamp())
+        self.wakeup.set()
+
+    def _schedule(self, doc_id, data, fire_ts):
+        self.reminders[doc_id] = data
+        self.due_at[doc_id] = fire_ts
+        heapq.heappush(self.heap, (fire_ts, doc_id))
+
+    def _forget(self, doc_id):
+        self.reminders.pop(doc_id, None)
+        self.due_at.pop(doc_id, None)
+        self.attempts.pop(doc_id, None)
+
+    def _pop_due(self, now):
+        """取出到期的提醒；提醒留在 self.reminders，直到確定發送成功或放棄重試"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_ts, doc_id = heapq.heappop(self.heap)
+            # 已刪除或時間已被修改的舊項目直接略過
+            if self.due_at.get(doc_id) != fire_ts:
+                continue
+            del self.due_at[doc_id]
+            due.append((doc_id, self.reminders[doc_id]))
+        return due
+
+    def _advance(self, doc_id, data):
+        """在記憶體中把重複提醒排到下一次時間，不必等 snapshot（Firestore 寫回失敗時系列也不會中斷）"""
+        next_dt, remaining = next_occurrence(data)
+        self._forget(doc_id)
+        if next_dt is None:
+            return
+        recurrence = {**data["recurrence"], "remaining": remaining}
+        self._schedule(
+            doc_id,
+            {**data, "datetime": next_dt, "recurrence": recurrence},
+            next_dt.timestamp(),
+        )
+
+    async def _after_dispatch(self, due, sent_ids):
+        sent_ids = set(sent_ids)
+        skipped = []
+        for doc_id, data in due:
+            # 發送期間 snapshot 已送來新版本（例如推進後的重複提醒）就以新版本為準
+            if self.reminders.get(doc_id) is not data:
+                continue
+            if doc_id in sent_ids:
+                self._advance(doc_id, data)
+                continue
+            attempts = self.attempts.get(doc_id, 0) + 1
+            if attempts < MAX_SEND_ATTEMPTS:
+                self.attempts[doc_id] = attempts
+                print(f"🔁 提醒 {doc_id} 將於 {RETRY_SECONDS}s 後重試（第 {attempts} 次失敗）")
+                self._schedule(doc_id, data, time.time() + RETRY_SECONDS)
+                continue
+            print(f"❌ 提醒 {doc_id} 發送失敗 {attempts} 次，放棄重試")
+            if data.get("recurrence"):
+                # 略過這一次，推進到下一次時間，避免整個系列停在過去的時間
+                print(f"⏭️ 略過重複提醒 {doc_id} 的 {data['datetime'].isoformat()} 這一次")
+                skipped.append((doc_id, data))
+                self._advance(doc_id, data)
+            else:
+                self._forget(doc_id)
+        await advance_reminders("notifications.skip_failed", skipped)
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self.wakeup.clear()
+
+            if self.listener is None or not self.listener.is_active:
+                print("⚠️ notify listener inactive, resubscribing")
+                try:
+                    self._subscribe()
+                except Exception as e:
+                    print(f"❌ notify listener 重新建立失敗：{type(e).__name__}: {e}")
+
+            due = self._pop_due(time.time())
+            for doc_id, data in due:
+                lateness = time.time() - data["datetime"].timestamp()
+                print(f"⏰ 提醒到期：{doc_id}（延遲 {lateness:.2f}s）")
+            sent_ids = await dispatch_reminders(self.bot, due)
+            await self._after_dispatch(due, sent_ids)
+
+            timeout = MAX_SLEEP_SECONDS
+            if self.heap:
+                timeout = min(timeout, max(0, self.heap[0][0] - time.time()))
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
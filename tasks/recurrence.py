@@ -0,0 +1,65 @@
+# tasks/recurrence.py
+
+from datetime import datetime, timedelta
+import pytz
+
+TIMEZONE = pytz.timezone("Asia/Taipei")
+
+FREQ_LABELS = {"hourly": "小時", "daily": "天", "weekly": "週"}
+
+
+def build_recurrence(freq, interval=1, until=None, count=None):
+    """建立存放在提醒文件中的重複規則（只存一份，下一次時間由排程器推算）"""
+    return {
+        "freq": freq,
+        "interval": max(1, interval or 1),
+        "until": until,
+        "remaining": count,
+    }
+
+
+def _step(dt, freq, interval):
+    if freq == "hourly":
+        return dt + timedelta(hours=interval)
+    # 以台北時間推算日/週，維持相同的當地時刻
+    local = dt.astimezone(TIMEZONE).replace(tzinfo=None)
+    days = interval if freq == "daily" else interval * 7
+    return TIMEZONE.localize(local + timedelta(days=days))
+
+
+def next_occurrence(data, now=None):
+    """回傳 (下一次時間, 剩餘次數)；規則已結束時回傳 (None, 0)。錯過的次數直接略過"""
+    recurrence = data.get("recurrence")
+    if not recurrence:
+        return None, 0
+
+    now = now or datetime.now(pytz.utc)
+    remaining = recurrence.get("remaining")
+    until = recurrence.get("until")
+    dt = data["datetime"]
+
+    while True:
+        if remaining is not None:
+            remaining -= 1
+            if remaining <= 0:
+                return None, 0
+        dt = _step(dt, recurrence["freq"], recurrence.get("interval", 1))
+        if until is not None and dt > until:
+            return None, 0
+        if dt > now:
+            return dt, remaining
+
+
+def describe(recurrence):
+    if not recurrence:
+        return ""
+    interval = recurrence.get("interval", 1)
+    label = FREQ_LABELS.get(recurrence["freq"], recurrence["freq"])
+    text = f"🔁 每 {interval} {label}" if interval > 1 else f"🔁 每{label}"
+    if recurrence.get("until"):
+        # until 存的是使用者指定日期的隔天 00:00，顯示時扣回一天
+        last_day = recurrence["until"].astimezone(TIMEZONE) - timedelta(days=1)
+        text += f" 至 {last_day.strftime('%Y-%m-%d')}"
+    if recurrence.get("remaining") is not None:
+        text += f"（剩 {recurrence['remaining']} 次）"
+    return text
@@ -0,0 +1,69 @@
+# tasks/reminder_cache.py
+
+import pytz
+
+TIMEZONE = pytz.timezone("Asia/Taipei")
+
+# 指令中顯示與輸入的提醒 ID 長度（文件 ID 的前綴）
+SHORT_ID_LENGTH = 6
+
+
+def short_id(doc_id):
+    return doc_id[:SHORT_ID_LENGTH]
+
+
+class ReminderCache:
+    """依 guild 分組的提醒快取：由 NotifyScheduler 的 snapshot listener 與指令寫入同步更新"""
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> {doc_id: data}
+        # 收到第一次 snapshot 後為 True，之後找不到的提醒就不必再查 Firestore
+        self.loaded = False
+
+    def clear(self):
+        self.guilds.clear()
+        self.loaded = False
+
+    def apply(self, updates):
+        for change_type, doc_id, data in updates:
+            if change_type == "REMOVED":
+                self.remove(doc_id)
+            else:
+                self.put(doc_id, data)
+        self.loaded = True
+
+    def put(self, doc_id, data):
+        guild_id = str(data.get("guild_id"))
+        # guild 或內容變動時先移除舊的紀錄
+        self.remove(doc_id)
+        self.guilds.setdefault(guild_id, {})[doc_id] = data
+
+    def remove(self, doc_id):
+        for reminders in self.guilds.values():
+            if reminders.pop(doc_id, None) is not None:
+                return
+
+    def list(self, guild_id):
+        """回傳依時間排序的 [(doc_id, data), ...]"""
+        reminders = self.guilds.get(str(guild_id), {})
+        return sorted(reminders.items(), key=lambda item: item[1]["datetime"])
+
+    def resolve(self, guild_id, reminder_id):
+        """以短 ID（或完整 ID）找出提醒；找不到或前綴不唯一時回傳 None"""
+        reminder_id = reminder_id.strip()
+        reminders = self.guilds.get(str(guild_id), {})
+        if reminder_id in reminders:
+            return reminder_id, reminders[reminder_id]
+        matches = [
+            (doc_id, data)
+            for doc_id, data in reminders.items()
+            if doc_id.startswith(reminder_id)
+        ]
+        return matches[0] if len(matches) == 1 else None
+
+    def label(self, doc_id, data):
+        dt = data["datetime"].astimezone(TIMEZONE).strftime("%Y-%m-%d %H:%M")
+        return f"{short_id(doc_id)} | {dt} | {data.get('message', '')}"
+
+
+reminder_cache = ReminderCache()
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# 測試直接匯入專案根目錄的模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+# tests/test_http_redeem.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestServer
+
+from http_redeem import HttpRedeemClient
+from mock_redeem_api import DEFAULT_SECRET, REQUESTS, make_app, sign
+
+
+def redeem_against_mock(codes, player_id="12345", secret=DEFAULT_SECRET, **app_kwargs):
+    """對本地模擬伺服器兌換，回傳 (outcomes, 伺服器收到的請求)"""
+
+    async def scenario():
+        app = make_app(**app_kwargs)
+        async with TestServer(app) as server:
+            client = HttpRedeemClient(str(server.make_url("/")), secret, retries=0)
+            try:
+                outcomes = await client.redeem_codes(codes, player_id)
+            finally:
+                await client.close()
+        return outcomes, app[REQUESTS]
+
+    return asyncio.run(scenario())
+
+
+def test_sign_matches_client():
+    client = HttpRedeemClient("http://127.0.0.1", DEFAULT_SECRET)
+    params = {"fid": "12345", "cdk": "SUCCESS", "time": 1700000000000}
+    assert client._sign(params) == sign(params, DEFAULT_SECRET)
+
+
+def test_requests_are_signed():
+    outcomes, requests = redeem_against_mock(["SUCCESS", "EXPIRED"])
+    assert [r["path"] for r in requests] == [
+        "/api/player",
+        "/api/gift_code",
+        "/api/gift_code",
+    ]
+    assert all(r["signed"] for r in requests)
+    assert all("time" in r["params"] for r in requests)
+
+
+def test_wrong_secret_fails_every_code():
+    outcomes, requests = redeem_against_mock(["SUCCESS"], secret="wrong")
+    assert not any(r["signed"] for r in requests)
+    assert [o["result"] for o in outcomes] == ["fail"]
+
+
+def test_error_codes_map_to_reasons():
+    codes = ["SUCCESS", "REDEEMED", "SAMETYPE", "EXPIRED", "USEDUP", "NOPE"]
+    outcomes, _ = redeem_against_mock(codes)
+    assert [o["code"] for o in outcomes] == codes
+    assert [o["reason"] for o in outcomes] == [
+        "Success",
+        "Redeemed",
+        "Redeemed",
+        "Expired",
+        "Unavailable",
+        "Invalid Code",
+    ]
+    assert [o["result"] for o in outcomes] == ["success"] + ["fail"] * 5
+
+
+def test_missing_player_is_invalid():
+    outcomes, requests = redeem_against_mock(
+        ["SUCCESS", "EXPIRED"], player_id="404", missing_players={"404"}
+    )
+    assert [o["reason"] for o in outcomes] == ["Invalid", "Invalid"]
+    # 角色不存在時不會再呼叫兌換 API
+    assert [r["path"] for r in requests] == ["/api/player"]
+
+
+def test_result_logger_receives_each_code():
+    logged = []
+
+    async def scenario():
+        async with TestServer(make_app()) as server:
+            client = HttpRedeemClient(
+                str(server.make_url("/")),
+                DEFAULT_SECRET,
+                log_result=lambda *args: logged.append(args),
+            )
+            try:
+                await client.redeem_codes(["SUCCESS", "NOPE"], "12345", "batch-1")
+            finally:
+                await client.close()
+
+    asyncio.run(scenario())
+    assert logged == [
+        ("SUCCESS", "12345", "batch-1", False, ""),
+        ("NOPE", "12345", "batch-1", True, "Invalid Code"),
+    ]